@@ -2,56 +2,117 @@ import asyncio
 import sys
 import os
 
-from PySide6.QtCore import QTranslator, QLockFile
-from qasync import QApplication, run
+from app.builtin import trace
+from app.builtin.single_instance import SingleInstance
 
-from app.builtin.locale import detect_system_ui_language
-from app.builtin.utils import get_updater, init_app, running_in_bundle
-from app.builtin.paths import AppPaths
-from app.main_window import MainWindow
+# Seconds an app started by the updater waits for the lock of the previous process
+RELAUNCH_LOCK_TIMEOUT = 30
 
 
-async def task():
+async def task(updater=None, instance: SingleInstance | None = None):
+    from qasync import QApplication
+
+    from app.main_window import MainWindow
+
     app_close_event = asyncio.Event()
     app = QApplication.instance()
     assert isinstance(app, QApplication)
     app.aboutToQuit.connect(app_close_event.set)
 
-    main_window = MainWindow()
-    main_window.show()
-    await main_window.async_init()
+    with trace.span("create MainWindow"):
+        main_window = MainWindow(updater)
+    with trace.span("show MainWindow"):
+        main_window.show()
+    trace.instant("main window shown")
+    if instance is not None:
+        instance.message_received.connect(main_window.bring_to_front)
+    with trace.span("MainWindow.async_init"):
+        await main_window.async_init()
+    trace.dump()
     await app_close_event.wait()
+    if updater is not None:
+        await updater.aclose()
 
 
 def main(enable_updater: bool = True):
+    trace.instant("main")
+    # check if the app is already running, before Qt widgets are imported
+    with trace.span("SingleInstance.acquire"):
+        instance = SingleInstance()
+        copy_self = "--updater-copy-self" in sys.argv
+        # The updater starts the installed app before its own process exited,
+        # wait for it to release the lock instead of forwarding to nobody
+        relaunched = "--updater-old-pid" in sys.argv and not copy_self
+        if not instance.acquire(RELAUNCH_LOCK_TIMEOUT if relaunched else 0):
+            # The updater copies itself while the old instance runs,
+            # that process exits while the updater is created.
+            # The install holds its own lock, see `TreeInstaller`
+            if not copy_self:
+                instance.forward(sys.argv[1:])
+                sys.exit(0)
+            instance = None
+
+    # roll back an update that crashed while replacing the installed files,
+    # the updater installs into the working directory, see `Updater.apply_update`
+    if enable_updater and "--updater-copy-self" not in sys.argv:
+        from app.builtin.install import recover_install
+
+        with trace.span("recover_install"):
+            recover_install(os.getcwd())
+
+    from PySide6.QtCore import QTranslator
+    from qasync import run
+
+    from app.builtin import diagnostics
+    from app.builtin.locale import detect_system_ui_language
+    from app.builtin.resources import APP_RESOURCES
+    from app.builtin.paths import AppPaths
+    from app.builtin.utils import get_updater, init_app, running_in_bundle
+
     # init QApplication
     app = init_app()
-    paths = AppPaths()
+    with trace.span("AppPaths"):
+        paths = AppPaths()
+    # opt-in leak diagnostics, APP_DIAGNOSTICS=1
+    monitor = diagnostics.install(app)
 
     # init updater, updater will remove some arguments
-    # and do update logic
-    updater = get_updater()
+    # and do update logic. Without updater, its modules are never imported.
+    updater = None
     # self-updating is not available on macOS
-    updater.is_enable = False if running_in_bundle else enable_updater
+    if enable_updater and not running_in_bundle():
+        with trace.span("create updater"):
+            updater = get_updater()
+
+        # override updater config
+        config_file = paths.update_dir / "updater.json"
+        if os.getenv("DEBUG", "0") == "1" and config_file.exists() and config_file.is_file():
+            updater.load_from_file_and_override(config_file)
 
-    # override updater config
-    config_file = paths.update_dir / "updater.json"
-    if os.getenv("DEBUG", "0") == "1" and config_file.exists() and config_file.is_file():
-        updater.load_from_file_and_override(config_file)
+        # rollout policy of a managed fleet, applied in release builds too
+        rollout_file = paths.update_dir / "rollout.json"
+        if rollout_file.is_file():
+            updater.load_rollout_from_file(rollout_file)
 
-    # check if the app is already running
-    lock_file = QLockFile(str(paths.base_dir) + "/App.lock")
-    if not lock_file.lock():
-        sys.exit(0)
+    # later launches forward their arguments to this instance
+    if instance is not None:
+        instance.listen()
 
     # i18n
-    translator = QTranslator()
-    lang_code = detect_system_ui_language()
-    translator.load(f":/i18n/{lang_code}.qm")
-    app.installTranslator(translator)
+    with trace.span("load translator"):
+        translator = QTranslator()
+        lang_code = detect_system_ui_language()
+        APP_RESOURCES.require("i18n")
+        translator.load(f":/i18n/{lang_code}.qm")
+        app.installTranslator(translator)
 
     # start event loop
-    run(task())
+    run(task(updater, instance))
+    if instance is not None:
+        instance.release()
+    if monitor is not None:
+        monitor.sample()
+    trace.dump()
 
 
 def main_no_updater():
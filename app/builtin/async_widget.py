@@ -1,27 +1,110 @@
 import asyncio
+from typing import Callable, Generic, TypeVar
 
+from PySide6.QtCore import QTimer, Qt, Signal
 from PySide6.QtWidgets import QWidget
-from PySide6.QtCore import Qt, Signal
 
 
-class AsyncWidget(QWidget):
+T = TypeVar("T")
+
+
+class AsyncWidget(QWidget, Generic[T]):
+    """
+    Application modal widget that can be awaited, `T` is the type of its result.
+
+    `async_show()` returns the value passed to `done()`, or `None` if the
+    widget was closed otherwise. A closed widget can be shown again, override
+    `reset()` to restore its initial state, see `WidgetPool`.
+    """
+
     _closed = Signal()
 
     def __init__(self, parent):
         super().__init__(parent)
         self.setWindowModality(Qt.WindowModality.ApplicationModal)
+        self._result: T | None = None
 
     def closeEvent(self, event):
         self._closed.emit()
         super().closeEvent(event)
 
-    async def async_show(self):
+    def reset(self):
+        """Restore the initial state before the widget is shown again."""
+
+    def done(self, result: T | None = None):
+        """Close the widget, `async_show()` returns `result`."""
+        self._result = result
+        self.close()
+
+    async def async_show(self, timeout: float | None = None) -> T | None:
+        """
+        Show the widget and wait until it is closed. The widget is closed if
+        the wait is cancelled or takes longer than `timeout` seconds
+        (`TimeoutError`).
+        """
         future = asyncio.get_event_loop().create_future()
+        self._result = None
 
         def resolve_future():
             if not future.done():
-                future.set_result(None)
+                future.set_result(self._result)
 
         self._closed.connect(resolve_future)
-        super().show()
-        await future
+        try:
+            super().show()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._closed.disconnect(resolve_future)
+            # Cancelled or timed out
+            if self.isVisible():
+                self.close()
+
+
+class WidgetPool(Generic[T]):
+    """
+    Keep up to `size` constructed widgets, so showing one costs no `setupUi()`.
+    `T` is the result type of the widgets.
+
+        pool = WidgetPool(lambda: UpdateWidget(self, updater))
+        pool.prewarm()
+        result = await pool.show(ready=True)
+
+    `show()` passes its arguments to `reset()` of a pooled widget.
+    """
+
+    def __init__(self, factory: Callable[[], AsyncWidget[T]], size: int = 1):
+        self.factory = factory
+        self.size = size
+        self._idle: list[AsyncWidget[T]] = []
+
+    def prewarm(self, delay: int = 0):
+        """Construct the widgets when the event loop is idle, after `delay` ms."""
+        QTimer.singleShot(delay, self._fill)
+
+    def _fill(self):
+        while len(self._idle) < self.size:
+            self._idle.append(self.factory())
+
+    def acquire(self) -> AsyncWidget[T]:
+        if self._idle:
+            return self._idle.pop()
+        return self.factory()
+
+    def release(self, widget: AsyncWidget[T]):
+        if len(self._idle) < self.size:
+            self._idle.append(widget)
+        else:
+            widget.deleteLater()
+
+    async def show(self, *args, timeout: float | None = None, **kwargs) -> T | None:
+        widget = self.acquire()
+        try:
+            widget.reset(*args, **kwargs)
+            return await widget.async_show(timeout)
+        finally:
+            self.release(widget)
+
+    def clear(self):
+        for widget in self._idle:
+            widget.deleteLater()
+        self._idle.clear()
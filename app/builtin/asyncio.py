@@ -1,11 +1,181 @@
+"""
+Named, bounded executors for blocking work called from coroutines.
+
+    await run_in_executor("cpu", extract_archive, filename, dest)
+
+Pools are created on first use, see `POOLS`:
+- `io`: blocking file and network I/O
+- `cpu`: CPU-bound work that releases the GIL, e.g. zlib and hashlib
+- `process`: pure Python CPU-bound work, arguments must be picklable
+
+Work in thread pools is cancelled cooperatively: cancelling the awaiting
+task cancels the `CancelToken` of the work, blocking functions call
+`raise_if_cancelled()` between steps. `shutdown_executors()` is connected to
+`QApplication.aboutToQuit` by `install_shutdown()`.
+"""
+
 import asyncio
-import sys
+import contextvars
+import os
+import threading
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextvars import ContextVar
 from functools import partial
-from typing import Callable, Any
-
-if sys.version_info >= (3, 9):
-    to_thread = asyncio.to_thread
-else:
-    async def to_thread(func: Callable, /, *args, **kwargs) -> Any:
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, partial(func, *args, **kwargs))
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from PySide6.QtCore import QCoreApplication
+
+_cpu_count = os.cpu_count() or 1
+
+# name -> (max_workers, use a process pool)
+POOLS: dict[str, tuple[int, bool]] = {
+    "io": (min(32, _cpu_count + 4), False),
+    "cpu": (_cpu_count, False),
+    "process": (_cpu_count, True),
+}
+
+_executors: dict[str, Executor] = {}
+_lock = threading.Lock()
+_current_token: ContextVar["CancelToken | None"] = ContextVar(
+    "cancel_token", default=None
+)
+# Tokens of running work, cancelled on shutdown
+_tokens: "weakref.WeakSet[CancelToken]" = weakref.WeakSet()
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """Thread-safe flag to stop blocking work between two steps."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+
+def current_token() -> CancelToken | None:
+    """Get the token of the work running in this thread, capture it before starting nested threads."""
+    return _current_token.get()
+
+
+def raise_if_cancelled():
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def configure_executor(name: str, max_workers: int, process: bool = False):
+    """Set the size of a pool, an already running pool of this name is replaced."""
+    with _lock:
+        POOLS[name] = (max_workers, process)
+        executor = _executors.pop(name, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def get_executor(name: str = "io") -> Executor:
+    with _lock:
+        executor = _executors.get(name)
+        if executor is None:
+            max_workers, process = POOLS[name]
+            if process:
+                from concurrent.futures import ProcessPoolExecutor
+
+                executor = ProcessPoolExecutor(max_workers=max_workers)
+            else:
+                executor = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix=f"{name}-pool"
+                )
+            _executors[name] = executor
+        return executor
+
+
+async def run_in_executor(
+    name: str,
+    func: Callable,
+    /,
+    *args,
+    token: CancelToken | None = None,
+    **kwargs,
+) -> Any:
+    """
+    Run `func` in the pool `name` and wait for the result.
+    The work sees `token` through `current_token()`, it is cancelled when the
+    awaiting task is cancelled. Process pool work can not see the token,
+    it is only dropped if it has not started yet.
+    """
+    executor = get_executor(name)
+    loop = asyncio.get_running_loop()
+    if token is None:
+        token = CancelToken()
+    if POOLS[name][1]:
+        call = partial(func, *args, **kwargs)
+    else:
+        context = contextvars.copy_context()
+        context.run(_current_token.set, token)
+        call = partial(context.run, func, *args, **kwargs)
+
+    _tokens.add(token)
+    try:
+        return await loop.run_in_executor(executor, call)
+    except asyncio.CancelledError:
+        token.cancel()
+        raise
+    finally:
+        _tokens.discard(token)
+
+
+async def to_thread(func: Callable, /, *args, **kwargs) -> Any:
+    """Run blocking I/O in the `io` pool, like `asyncio.to_thread`."""
+    return await run_in_executor("io", func, *args, **kwargs)
+
+
+def threadsafe_callback(callback: Callable[..., None]) -> Callable[..., None]:
+    """
+    Wrap `callback`, e.g. a progress callback, so worker threads can call it.
+    Calls from other threads are queued to the running event loop,
+    which is the Qt main thread with qasync.
+    """
+    loop = asyncio.get_running_loop()
+    thread_id = threading.get_ident()
+
+    def wrapper(*args):
+        if threading.get_ident() == thread_id:
+            callback(*args)
+            return
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop is closed, the app is quitting
+            pass
+
+    return wrapper
+
+
+def shutdown_executors(wait: bool = False):
+    """Cancel running work and queued calls, and stop all pools."""
+    for token in list(_tokens):
+        token.cancel()
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def install_shutdown(app: "QCoreApplication"):
+    app.aboutToQuit.connect(shutdown_executors)
@@ -0,0 +1,220 @@
+"""
+Checksums of release packages, published as `<package>.sha256` next to the package.
+
+    {"size": 0, "sha256": "...", "block_size": 4194304, "blocks": ["...", ...]}
+
+The block hashes let a download verify every block while it streams and
+re-fetch only the blocks that do not match. A plain `sha256sum` line
+(`<hex>  <name>`) is accepted too, it only verifies the whole file.
+
+Create one with:
+
+    python -m app.builtin.checksum <package>
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+CHECKSUM_SUFFIX = ".sha256"
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class ChecksumError(RuntimeError):
+    pass
+
+
+class Checksum:
+    def __init__(
+        self,
+        sha256: str,
+        size: int = 0,
+        block_size: int = 0,
+        blocks: list[str] | None = None,
+    ):
+        self.sha256 = sha256.lower()
+        # 0 if unknown
+        self.size = size
+        self.block_size = block_size
+        self.blocks = [block.lower() for block in blocks or []]
+
+
+def parse_checksum(text: str) -> Checksum:
+    text = text.strip()
+    if text.startswith("{"):
+        try:
+            data = json.loads(text)
+            return Checksum(
+                data["sha256"],
+                int(data.get("size", 0)),
+                int(data.get("block_size", 0)),
+                data.get("blocks"),
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            raise ChecksumError(f"Invalid checksum file: {e}") from e
+    digest = text.split()[0] if text else ""
+    if len(digest) != 64:
+        raise ChecksumError("Invalid checksum file")
+    return Checksum(digest)
+
+
+def create_checksum(file: str | Path, block_size: int = BLOCK_SIZE) -> dict:
+    whole = hashlib.sha256()
+    blocks = []
+    size = 0
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            whole.update(block)
+            blocks.append(hashlib.sha256(block).hexdigest())
+            size += len(block)
+    return {
+        "size": size,
+        "sha256": whole.hexdigest(),
+        "block_size": block_size,
+        "blocks": blocks,
+    }
+
+
+class _BlockState:
+    def __init__(self, position: int):
+        self.hash = hashlib.sha256()
+        # Next offset expected for this block
+        self.position = position
+
+
+class StreamVerifier:
+    """
+    Verify a file block by block while it is written.
+
+    `feed()` must see the bytes of a block in order to hash it on the fly,
+    blocks that are fed out of order (e.g. split between two download ranges,
+    or resumed) are read back from disk by `finish()`. Without block hashes
+    the whole file is one block.
+    """
+
+    def __init__(self, checksum: Checksum, size: int):
+        if checksum.size and size and checksum.size != size:
+            raise ChecksumError(
+                f"Size mismatch, expected {checksum.size} bytes, got {size}"
+            )
+        self.checksum = checksum
+        self.size = size or checksum.size
+        if checksum.blocks and checksum.block_size > 0:
+            self.block_size = checksum.block_size
+            self.expected = checksum.blocks
+        else:
+            self.block_size = max(1, self.size)
+            self.expected = [checksum.sha256]
+        count = -(-self.size // self.block_size) if self.size else 1
+        if len(self.expected) != count:
+            raise ChecksumError("Block count does not match the size")
+        self.verified: set[int] = set()
+        self.bad: set[int] = set()
+        self._states: dict[int, _BlockState] = {}
+        # Blocks that could not be hashed while streaming
+        self._skipped: set[int] = set()
+        self._lock = threading.Lock()
+
+    def block_range(self, index: int) -> tuple[int, int]:
+        """Get the first and the last (inclusive) offset of a block."""
+        start = index * self.block_size
+        return start, min(self.size, start + self.block_size) - 1
+
+    def feed(self, offset: int, data: bytes | memoryview):
+        view = memoryview(data)
+        received = offset + len(view)
+        if received > self.size:
+            raise ChecksumError(
+                f"Size mismatch, expected {self.size} bytes, got at least {received}"
+            )
+        with self._lock:
+            while view:
+                index = offset // self.block_size
+                start, end = self.block_range(index)
+                n = min(len(view), end - offset + 1)
+                self._feed_block(index, start, end, offset, view[:n])
+                offset += n
+                view = view[n:]
+
+    def _feed_block(
+        self, index: int, start: int, end: int, offset: int, data: memoryview
+    ):
+        if index in self._skipped:
+            return
+        state = self._states.get(index)
+        if state is None:
+            if offset != start:
+                self._skipped.add(index)
+                return
+            state = self._states[index] = _BlockState(start)
+        elif offset != state.position:
+            del self._states[index]
+            self._skipped.add(index)
+            return
+        state.hash.update(data)
+        state.position += len(data)
+        if state.position > end:
+            del self._states[index]
+            self._check(index, state.hash.hexdigest())
+
+    def _check(self, index: int, digest: str):
+        if digest == self.expected[index]:
+            self.verified.add(index)
+            self.bad.discard(index)
+        else:
+            self.bad.add(index)
+            self.verified.discard(index)
+
+    def reset(self, blocks: list[int]):
+        """Verify `blocks` again, e.g. before they are re-fetched."""
+        with self._lock:
+            for index in blocks:
+                self.verified.discard(index)
+                self.bad.discard(index)
+                self._skipped.discard(index)
+                self._states.pop(index, None)
+
+    def finish(self, file: str | Path) -> list[int]:
+        """Hash the blocks not verified while streaming from `file`, return the bad blocks."""
+        with self._lock:
+            pending = [
+                index
+                for index in range(len(self.expected))
+                if index not in self.verified and index not in self.bad
+            ]
+            self._states.clear()
+            self._skipped.clear()
+        if pending:
+            with open(file, "rb") as f:
+                for index in pending:
+                    start, end = self.block_range(index)
+                    f.seek(start)
+                    h = hashlib.sha256()
+                    remaining = end - start + 1
+                    while remaining > 0:
+                        chunk = f.read(min(remaining, 1024 * 1024))
+                        if not chunk:
+                            break
+                        h.update(chunk)
+                        remaining -= len(chunk)
+                    with self._lock:
+                        self._check(index, h.hexdigest())
+        return sorted(self.bad)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the checksum file of a package.")
+    parser.add_argument("package", help="Release package")
+    parser.add_argument(
+        "--block-size", type=int, default=BLOCK_SIZE, help="Bytes per block hash"
+    )
+    args = parser.parse_args()
+    output = Path(f"{args.package}{CHECKSUM_SUFFIX}")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(create_checksum(args.package, args.block_size), f)
+
+
+if __name__ == "__main__":
+    main()
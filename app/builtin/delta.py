@@ -0,0 +1,144 @@
+"""
+Delta packages between two consecutive releases.
+
+A delta package is a zip file that contains the manifest of the whole new
+tree and only the files that changed:
+
+    manifest.json       manifest of the new tree, see `app.builtin.manifest`
+    files/<path>        added or changed files
+
+Symlinks are only recorded in the manifest, with their target.
+
+It is applied on top of an installed directory; every file of the rebuilt
+tree is verified against the manifest.
+
+Create one with:
+
+    python -m app.builtin.delta <old_dir> <new_dir> <output.zip>
+"""
+
+import argparse
+import json
+import os
+import shutil
+import zipfile
+from pathlib import Path
+
+from app.builtin.asyncio import OperationCancelled, raise_if_cancelled
+from app.builtin.manifest import (
+    MANIFEST_NAME,
+    FileEntry,
+    build_manifest,
+    dump_manifest,
+    hash_file,
+    parse_manifest,
+    same_content,
+)
+
+_FILES_PREFIX = "files/"
+
+
+class DeltaError(RuntimeError):
+    pass
+
+
+def create_delta(old_dir: str | Path, new_dir: str | Path, output: str | Path):
+    old_dir = Path(old_dir)
+    new_dir = Path(new_dir)
+    old_files = build_manifest(old_dir)
+    new_files = build_manifest(new_dir)
+
+    manifest_file = Path(f"{output}.manifest")
+    dump_manifest(new_files, manifest_file)
+    try:
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.write(manifest_file, MANIFEST_NAME)
+            for rel, entry in new_files.items():
+                if "symlink" in entry:
+                    continue
+                if not same_content(old_files.get(rel), entry):
+                    zf.write(new_dir / rel, _FILES_PREFIX + rel)
+    finally:
+        manifest_file.unlink(missing_ok=True)
+
+
+def apply_delta(
+    delta_file: str | Path, installed_dir: str | Path, target_dir: str | Path
+):
+    """
+    Rebuild the new tree in `target_dir` from `installed_dir` and the delta.
+    Raise `DeltaError` if any file does not match the manifest,
+    `target_dir` is removed in that case.
+    """
+    installed_dir = Path(installed_dir)
+    target_dir = Path(target_dir)
+    if target_dir.exists():
+        shutil.rmtree(target_dir)
+    try:
+        with zipfile.ZipFile(delta_file, "r") as zf:
+            files = _read_manifest(zf)
+            changed = {
+                info.filename[len(_FILES_PREFIX):]: info
+                for info in zf.infolist()
+                if info.filename.startswith(_FILES_PREFIX) and not info.is_dir()
+            }
+            for rel, entry in files.items():
+                raise_if_cancelled()
+                target = target_dir / rel
+                if not target.resolve().is_relative_to(target_dir.resolve()):
+                    raise DeltaError(f"Invalid path in delta: {rel}")
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if "symlink" in entry:
+                    link = entry["symlink"]
+                    if not (target.parent / link).resolve().is_relative_to(
+                        target_dir.resolve()
+                    ):
+                        raise DeltaError(f"Invalid symlink in delta: {rel}")
+                    os.symlink(link, target)
+                    continue
+                if rel in changed:
+                    info = changed[rel]
+                    with zf.open(info) as src, open(target, "wb") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    mode = info.external_attr >> 16
+                    if mode:
+                        os.chmod(target, mode & 0o777)
+                else:
+                    source = installed_dir / rel
+                    if not source.is_file():
+                        raise DeltaError(f"Missing installed file: {rel}")
+                    shutil.copy2(source, target)
+                if hash_file(target) != entry["sha256"]:
+                    raise DeltaError(f"Checksum mismatch: {rel}")
+            # Keep the manifest, so the install step only touches changed files
+            dump_manifest(files, target_dir / MANIFEST_NAME)
+    except (
+        DeltaError,
+        OperationCancelled,
+        OSError,
+        zipfile.BadZipFile,
+        KeyError,
+        ValueError,
+    ) as e:
+        shutil.rmtree(target_dir, ignore_errors=True)
+        if isinstance(e, (DeltaError, OperationCancelled)):
+            raise
+        raise DeltaError(f"Failed to apply delta: {e}") from e
+
+
+def _read_manifest(zf: zipfile.ZipFile) -> dict[str, FileEntry]:
+    with zf.open(MANIFEST_NAME) as f:
+        return parse_manifest(json.load(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a delta update package.")
+    parser.add_argument("old_dir", help="Directory of the previous release")
+    parser.add_argument("new_dir", help="Directory of the new release")
+    parser.add_argument("output", help="Output zip file")
+    args = parser.parse_args()
+    create_delta(args.old_dir, args.new_dir, args.output)
+
+
+if __name__ == "__main__":
+    main()
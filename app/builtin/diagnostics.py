@@ -0,0 +1,146 @@
+"""
+Memory and QObject leak diagnostics for long sessions.
+
+Enabled with `APP_DIAGNOSTICS=1`, every `APP_DIAGNOSTICS_INTERVAL` seconds
+(default 600) a `tracemalloc` snapshot is compared with the previous one
+and the live QObjects are counted by class. Each sample is appended as one
+JSON line to `AppPaths.base_dir/diagnostics.jsonl`:
+
+    {"time": ..., "traced": ..., "peak": ..., "top": [...], "qobjects": {...}}
+
+`top` holds the allocation sites that grew the most, `qobjects` the classes
+whose count changed. Without the flag nothing is traced.
+"""
+
+import json
+import os
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+from PySide6.QtCore import QCoreApplication, QObject, QTimer
+
+ENV_FLAG = "APP_DIAGNOSTICS"
+INTERVAL_ENV = "APP_DIAGNOSTICS_INTERVAL"
+
+enabled = os.getenv(ENV_FLAG, "0") == "1"
+
+
+def count_qobjects(roots: list[QObject] | None = None) -> Counter[str]:
+    """
+    Count QObjects by class, walking the children of `roots`,
+    default to the application and its top level widgets.
+    """
+    if roots is None:
+        roots = []
+        app = QCoreApplication.instance()
+        if app is not None:
+            roots.append(app)
+            top_level_widgets = getattr(app, "topLevelWidgets", None)
+            if top_level_widgets is not None:
+                # Widgets without a parent are not children of the application
+                roots.extend(top_level_widgets())
+    seen: set[int] = set()
+    counts: Counter[str] = Counter()
+    for root in roots:
+        for obj in [root, *root.findChildren(QObject)]:
+            key = id(obj)
+            if key in seen:
+                continue
+            seen.add(key)
+            counts[type(obj).__name__] += 1
+    return counts
+
+
+class MemoryMonitor(QObject):
+    """Sample `tracemalloc` and the QObject counts, see the module docstring."""
+
+    # Allocation sites per sample
+    top = 20
+
+    def __init__(self, file: str | Path, frames: int = 5, parent: QObject | None = None):
+        super().__init__(parent)
+        self.file = Path(file)
+        self.frames = frames
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.sample)
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._qobjects: Counter[str] = Counter()
+        # Tracing started by someone else, e.g. `python -X tracemalloc`, keeps running
+        self._started_tracing = False
+
+    def start(self, interval: float):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self._snapshot = self._take_snapshot()
+        self._qobjects = count_qobjects()
+        self._timer.start(int(interval * 1000))
+
+    def stop(self):
+        self._timer.stop()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self._snapshot = None
+
+    def sample(self) -> dict:
+        """Append the growth since the last sample to the file and return it."""
+        snapshot = self._take_snapshot()
+        qobjects = count_qobjects()
+        top = []
+        if self._snapshot is not None:
+            for stat in snapshot.compare_to(self._snapshot, "traceback")[: self.top]:
+                if stat.size_diff <= 0:
+                    break
+                top.append(
+                    {
+                        # Most recent frame first
+                        "where": [
+                            f"{frame.filename}:{frame.lineno}"
+                            for frame in reversed(stat.traceback)
+                        ],
+                        "size_diff": stat.size_diff,
+                        "count_diff": stat.count_diff,
+                    }
+                )
+        changed = {
+            name: qobjects[name] - self._qobjects[name]
+            for name in qobjects | self._qobjects
+            if qobjects[name] != self._qobjects[name]
+        }
+        traced, peak = tracemalloc.get_traced_memory()
+        record = {
+            "time": time.time(),
+            "traced": traced,
+            "peak": peak,
+            "top": top,
+            "qobjects": changed,
+        }
+        self._snapshot = snapshot
+        self._qobjects = qobjects
+        with open(self.file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        return record
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            )
+        )
+
+
+def install(parent: QObject | None = None) -> MemoryMonitor | None:
+    """Start the monitor if `APP_DIAGNOSTICS=1`."""
+    if not enabled:
+        return None
+    from app.builtin.paths import AppPaths
+
+    monitor = MemoryMonitor(AppPaths().base_dir / "diagnostics.jsonl", parent=parent)
+    monitor.start(float(os.getenv(INTERVAL_ENV, "600")))
+    return monitor
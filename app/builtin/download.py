@@ -0,0 +1,495 @@
+import asyncio
+import json
+import os
+import queue
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from httpx import AsyncClient, Response, TransportError
+
+from app.builtin.asyncio import run_in_executor
+from app.builtin.checksum import Checksum, ChecksumError, StreamVerifier
+
+ProgressCallback = Callable[[int, int], None]
+ChunkSink = Callable[[bytes], Awaitable[None]]
+DataCallback = Callable[[int, memoryview], None]
+
+
+class TokenBucket:
+    """
+    Limit the throughput of concurrent streams to `rate` units per second.
+
+    `consume()` takes the tokens right away and sleeps off any debt, so
+    concurrent callers queue behind each other. Up to `capacity` tokens
+    accumulate while idle and can be spent as a burst.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate / 10
+        self.clock: Callable[[], float] = time.monotonic
+        self._tokens = self.capacity
+        self._last = self.clock()
+
+    async def consume(self, amount: int):
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= amount
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+
+class BufferedFileWriter:
+    """
+    Write buffers to a file from a worker of the `io` pool,
+    so disk flushes never block the event loop.
+
+    Buffers come from a fixed pool of preallocated `bytearray`s: `acquire()`
+    waits until the writer has released one, which limits the memory in
+    flight to `count * size` bytes. Writes are positional and run in order,
+    `on_data(offset, data)` sees every written buffer on the writer thread.
+    """
+
+    def __init__(
+        self,
+        filename: str | Path,
+        mode: str,
+        size: int,
+        count: int,
+        on_data: DataCallback | None = None,
+    ):
+        self._file = open(filename, mode)
+        self._on_data = on_data
+        self._loop = asyncio.get_running_loop()
+        self._free: asyncio.Queue[bytearray] = asyncio.Queue()
+        for _ in range(count):
+            self._free.put_nowait(bytearray(size))
+        self._jobs: queue.SimpleQueue = queue.SimpleQueue()
+        self._error: BaseException | None = None
+        self._task = asyncio.ensure_future(run_in_executor("io", self._run))
+
+    async def acquire(self) -> bytearray:
+        self._raise_error()
+        return await self._free.get()
+
+    def submit(
+        self,
+        buffer: bytearray,
+        length: int,
+        offset: int,
+        on_written: Callable[[], None] | None = None,
+    ):
+        """Write `buffer[:length]` at `offset`, `on_written` is called on the event loop."""
+        self._raise_error()
+        self._jobs.put((buffer, length, offset, on_written))
+
+    def release(self, buffer: bytearray):
+        """Return a buffer that is not submitted."""
+        self._free.put_nowait(buffer)
+
+    async def close(self, raise_error: bool = True):
+        """Wait for the pending writes and close the file."""
+        self._jobs.put(None)
+        # The writer closes the file itself, even if this wait is cancelled
+        await asyncio.shield(self._task)
+        if raise_error:
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        fd = self._file.fileno()
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self._file.close()
+                return
+            buffer, length, offset, on_written = job
+            if self._error is None:
+                try:
+                    data = memoryview(buffer)[:length]
+                    self._write(fd, data, offset)
+                    if self._on_data is not None:
+                        self._on_data(offset, data)
+                except Exception as e:
+                    # e.g. disk full, or `ChecksumError` from `on_data`,
+                    # the buffer is still returned to the free list
+                    self._error = e
+                    on_written = None
+            self._loop.call_soon_threadsafe(self._written, buffer, on_written)
+
+    def _write(self, fd: int, data: memoryview, offset: int):
+        if not hasattr(os, "pwrite"):
+            # Windows, only this thread touches the file position
+            self._file.seek(offset)
+            self._file.write(data)
+            return
+        while data:
+            written = os.pwrite(fd, data, offset)
+            data = data[written:]
+            offset += written
+
+    def _written(self, buffer: bytearray, on_written: Callable[[], None] | None):
+        self._free.put_nowait(buffer)
+        if on_written is not None:
+            on_written()
+
+
+class RangedDownloader:
+    """
+    Download a file with N concurrent byte ranges into a preallocated file.
+
+    Progress of every range is kept in a sidecar journal (`<filename>.journal`),
+    so an interrupted download resumes where it stopped on the next run.
+    Falls back to a single sequential stream when the server does not
+    advertise `Accept-Ranges: bytes` or the size is unknown.
+
+    Received data is collected in buffers of about `flush_interval` seconds
+    of throughput and written by a `BufferedFileWriter`, the journal only
+    records bytes that are on disk.
+
+    `bandwidth` caps the total throughput of all ranges in bytes per second.
+
+    With a `checksum`, blocks are hashed by the writer as they are written,
+    blocks that do not match are fetched again (`ChecksumError` if the
+    server does not support ranges or they still do not match).
+    """
+
+    retries = 3
+    # Bytes written between two journal flushes
+    journal_interval = 1024 * 1024
+    # Bounds of the adaptive write size
+    min_buffer_size = 64 * 1024
+    buffer_size = 1024 * 1024
+    flush_interval = 0.1
+    # Reserve the disk space up front with `posix_fallocate` where available
+    fallocate = True
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        url: str,
+        filename: str | Path,
+        total_size: int = 0,
+        accept_ranges: bool = False,
+        connections: int = 4,
+        checksum: Checksum | None = None,
+        bandwidth: int = 0,
+    ):
+        self.client = client
+        self.url = url
+        self.filename = Path(filename)
+        self.journal_file = Path(f"{filename}.journal")
+        self.total_size = total_size
+        self.accept_ranges = accept_ranges
+        self.connections = max(1, connections)
+        self.checksum = checksum
+        self._bucket = TokenBucket(bandwidth) if bandwidth > 0 else None
+        # True if blocks had to be fetched again, a `sink` has seen bad data
+        self.repaired = False
+
+        self.downloaded = 0
+        # [start, end, offset] per range, `end` is inclusive,
+        # `offset` is the next byte to write
+        self._ranges: list[list[int]] = []
+        self._unflushed = 0
+        self._on_progress: ProgressCallback | None = None
+        self._verifier: StreamVerifier | None = None
+
+    @property
+    def resumable(self) -> bool:
+        return self.accept_ranges and self.total_size > 0
+
+    async def run(
+        self,
+        on_progress: ProgressCallback | None = None,
+        sink: ChunkSink | None = None,
+    ):
+        """
+        Download the file, `sink` receives every chunk in order
+        in addition to the file, e.g. for extracting while downloading.
+        The download waits for `sink`, a slow consumer slows it down.
+        With a `sink` the file is fetched from the start as one range,
+        an existing journal is discarded.
+        """
+        self._on_progress = on_progress
+        self._verifier = None
+        if self.checksum is not None and (self.total_size or self.checksum.size):
+            # Fails early if the published size does not match
+            self._verifier = StreamVerifier(self.checksum, self.total_size)
+        if not self.resumable:
+            await self._download_stream(sink)
+            await self._verify()
+            return
+
+        if sink is not None:
+            self._ranges = [[0, self.total_size - 1, 0]]
+            self._preallocate()
+            self._save_journal()
+        elif not self._load_journal():
+            self._ranges = self._split_ranges()
+            self._preallocate()
+            self._save_journal()
+        self.downloaded = sum(offset - start for start, _, offset in self._ranges)
+        self._report()
+
+        await self._download_ranges(sink)
+        await self._verify()
+        self.journal_file.unlink(missing_ok=True)
+
+    async def _download_ranges(self, sink: ChunkSink | None = None):
+        pending = [r for r in self._ranges if r[2] <= r[1]]
+        writer = BufferedFileWriter(
+            self.filename,
+            "r+b",
+            self.buffer_size,
+            len(pending) + 2,
+            self._verifier.feed if self._verifier is not None else None,
+        )
+        tasks = [
+            asyncio.ensure_future(self._download_range(r, writer, sink))
+            for r in pending
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Stop the other ranges before the journal is written
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await writer.close(raise_error=False)
+            raise
+        finally:
+            self._save_journal()
+        await writer.close()
+
+    async def _verify(self):
+        """Check the blocks not verified while downloading, fetch bad blocks again."""
+        if self.checksum is None:
+            return
+        verifier = self._verifier
+        if verifier is None:
+            # The size was unknown until the download finished
+            verifier = self._verifier = StreamVerifier(
+                self.checksum, self.filename.stat().st_size
+            )
+        bad = await run_in_executor("cpu", verifier.finish, self.filename)
+        attempt = 0
+        while bad:
+            if not self.resumable or attempt >= self.retries:
+                self.journal_file.unlink(missing_ok=True)
+                self.filename.unlink(missing_ok=True)
+                raise ChecksumError(
+                    f"Checksum mismatch in {self.filename.name}, blocks {bad}"
+                )
+            attempt += 1
+            self.repaired = True
+            verifier.reset(bad)
+            self._ranges = []
+            for index in bad:
+                start, end = verifier.block_range(index)
+                self._ranges.append([start, end, start])
+                self.downloaded -= end - start + 1
+            await self._download_ranges()
+            bad = await run_in_executor("cpu", verifier.finish, self.filename)
+
+    def _split_ranges(self) -> list[list[int]]:
+        count = min(self.connections, max(1, self.total_size // self.min_buffer_size))
+        part = self.total_size // count
+        ranges = []
+        for i in range(count):
+            start = i * part
+            end = self.total_size - 1 if i == count - 1 else start + part - 1
+            ranges.append([start, end, start])
+        return ranges
+
+    def _preallocate(self):
+        with open(self.filename, "wb") as f:
+            f.truncate(self.total_size)
+            if self.fallocate and hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(f.fileno(), 0, self.total_size)
+                except OSError:
+                    # e.g. not supported by the file system, the sparse file works too
+                    pass
+
+    def _load_journal(self) -> bool:
+        """Restore ranges from the journal if it belongs to the same download."""
+        if not self.journal_file.is_file() or not self.filename.is_file():
+            return False
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (
+                data.get("url") != self.url
+                or data.get("total_size") != self.total_size
+                or self.filename.stat().st_size != self.total_size
+            ):
+                return False
+            ranges = [
+                [int(start), int(end), int(offset)]
+                for start, end, offset in data["ranges"]
+            ]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Truncated or written by an older version, start over
+            return False
+        if not ranges or any(not start <= offset <= end + 1 for start, end, offset in ranges):
+            return False
+        self._ranges = ranges
+        return True
+
+    def _save_journal(self):
+        if not self._ranges:
+            return
+        tmp_file = self.journal_file.with_name(self.journal_file.name + ".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "url": self.url,
+                    "total_size": self.total_size,
+                    "ranges": self._ranges,
+                },
+                f,
+            )
+        os.replace(tmp_file, self.journal_file)
+        self._unflushed = 0
+
+    def _report(self):
+        if self._on_progress is not None:
+            self._on_progress(self.downloaded, self.total_size)
+
+    def _written(self, r: list[int], end: int):
+        self._unflushed += end - r[2]
+        r[2] = end
+        if self._unflushed >= self.journal_interval:
+            self._save_journal()
+
+    def _next_buffer_size(self, size: int, elapsed: float) -> int:
+        """Size of the next write, about `flush_interval` seconds of data."""
+        if elapsed <= 0:
+            return self.buffer_size
+        target = int(size / elapsed * self.flush_interval)
+        return max(self.min_buffer_size, min(self.buffer_size, target))
+
+    async def _receive(
+        self,
+        response: Response,
+        writer: BufferedFileWriter,
+        cursor: list[int],
+        end: int | None,
+        on_written: Callable[[int], None] | None,
+        sink: ChunkSink | None,
+    ):
+        """
+        Copy the body into writer buffers starting at file offset `cursor[0]`,
+        stop after byte `end` if set. `cursor[0]` follows the received bytes,
+        also if the transfer fails.
+        """
+        buffer = None
+        buffer_start = cursor[0]
+        filled = 0
+        limit = self.min_buffer_size
+        started = time.monotonic()
+
+        def flush():
+            nonlocal buffer, filled, limit, started
+            now = time.monotonic()
+            limit = self._next_buffer_size(filled, now - started)
+            started = now
+            callback = None
+            if on_written is not None:
+                written_end = buffer_start + filled
+                callback = lambda: on_written(written_end)  # noqa: E731
+            writer.submit(buffer, filled, buffer_start, callback)
+            buffer = None
+            filled = 0
+
+        try:
+            async for chunk in response.aiter_bytes():
+                if end is not None:
+                    chunk = chunk[: end - cursor[0] + 1]
+                if sink is not None:
+                    await sink(chunk)
+                view = memoryview(chunk)
+                while view:
+                    if buffer is None:
+                        buffer = await writer.acquire()
+                        buffer_start = cursor[0]
+                    n = min(len(view), limit - filled)
+                    buffer[filled : filled + n] = view[:n]
+                    filled += n
+                    cursor[0] += n
+                    view = view[n:]
+                    if filled >= limit:
+                        flush()
+                self.downloaded += len(chunk)
+                self._report()
+                if self._bucket is not None:
+                    await self._bucket.consume(len(chunk))
+                if end is not None and cursor[0] > end:
+                    break
+        finally:
+            if buffer is not None:
+                if filled:
+                    flush()
+                else:
+                    writer.release(buffer)
+
+    async def _download_range(
+        self,
+        r: list[int],
+        writer: BufferedFileWriter,
+        sink: ChunkSink | None = None,
+    ):
+        attempt = 0
+        # Next byte to request, `r[2]` follows once it is written
+        cursor = [r[2]]
+        while cursor[0] <= r[1]:
+            try:
+                headers = {"Range": f"bytes={cursor[0]}-{r[1]}"}
+                async with self.client.stream(
+                    "GET", self.url, headers=headers, follow_redirects=True
+                ) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise RuntimeError(
+                            f"Server ignored range request for {self.url}"
+                        )
+                    await self._receive(
+                        response,
+                        writer,
+                        cursor,
+                        r[1],
+                        lambda written_end: self._written(r, written_end),
+                        sink,
+                    )
+            except TransportError:
+                # The bytes received before the error are kept
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+
+    async def _download_stream(self, sink: ChunkSink | None = None):
+        async with self.client.stream(
+            "GET", self.url, follow_redirects=True
+        ) as response:
+            response.raise_for_status()
+            self.total_size = int(response.headers.get("content-length", 0))
+            self.downloaded = 0
+            writer = BufferedFileWriter(
+                self.filename,
+                "wb",
+                self.buffer_size,
+                3,
+                self._verifier.feed if self._verifier is not None else None,
+            )
+            try:
+                await self._receive(response, writer, [0], None, None, sink)
+            except BaseException:
+                await writer.close(raise_error=False)
+                raise
+            await writer.close()
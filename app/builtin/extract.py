@@ -0,0 +1,242 @@
+import asyncio
+import os
+import queue
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from pathlib import Path
+from typing import Callable, Iterator
+
+from app.builtin.asyncio import current_token, raise_if_cancelled
+
+
+def is_tar_archive(filename: str | Path) -> bool:
+    return str(filename).endswith((".tar.gz", ".tgz"))
+
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def extract_archive(
+    filename: str | Path,
+    dest: str | Path,
+    on_progress: ProgressCallback | None = None,
+):
+    filename = str(filename)
+    if filename.endswith(".zip"):
+        extract_zip_parallel(filename, dest, on_progress=on_progress)
+    elif is_tar_archive(filename):
+        with tarfile.open(filename, "r:gz") as tar_ref:
+            tar_ref.extractall(
+                dest, members=_cancellable_members(tar_ref), filter="data"
+            )
+    else:
+        raise RuntimeError(f"Unsupported file format: {filename}")
+
+
+def _cancellable_members(tar_ref: tarfile.TarFile) -> Iterator[tarfile.TarInfo]:
+    for member in tar_ref:
+        raise_if_cancelled()
+        yield member
+
+
+def _split_members(
+    members: list[zipfile.ZipInfo], count: int
+) -> list[list[zipfile.ZipInfo]]:
+    """Split members into `count` buckets of about the same uncompressed size."""
+    buckets: list[list[zipfile.ZipInfo]] = [[] for _ in range(count)]
+    sizes = [0] * count
+    for info in sorted(members, key=lambda x: x.file_size, reverse=True):
+        i = sizes.index(min(sizes))
+        buckets[i].append(info)
+        sizes[i] += info.file_size
+    return [bucket for bucket in buckets if bucket]
+
+
+def extract_zip_parallel(
+    filename: str | Path,
+    dest: str | Path,
+    workers: int | None = None,
+    on_progress: ProgressCallback | None = None,
+):
+    """
+    Extract a zip file with a thread pool, every worker has its own `ZipFile` handle.
+    Each member is checked against the CRC-32 and size in the central directory,
+    `zipfile.BadZipFile` is raised on mismatch.
+    `on_progress(done, total)` is called from the worker threads.
+    """
+    dest = Path(dest)
+    # Workers of the inner pool do not inherit the context
+    token = current_token()
+    with zipfile.ZipFile(filename, "r") as zf:
+        members = zf.infolist()
+        # Create directories up front, so workers do not race on them
+        for info in members:
+            if info.is_dir():
+                zf.extract(info, dest)
+    files = [info for info in members if not info.is_dir()]
+    total = len(files)
+    done = 0
+    lock = threading.Lock()
+
+    def extract_bucket(bucket: list[zipfile.ZipInfo]):
+        nonlocal done
+        with zipfile.ZipFile(filename, "r") as zf:
+            for info in bucket:
+                if token is not None:
+                    token.raise_if_cancelled()
+                # ZipExtFile raises BadZipFile on a CRC-32 mismatch
+                path = zf.extract(info, dest)
+                if os.path.getsize(path) != info.file_size:
+                    raise zipfile.BadZipFile(f"Bad size for file {info.filename!r}")
+                mode = info.external_attr >> 16
+                if mode and info.create_system == 3:
+                    os.chmod(path, mode & 0o777)
+                with lock:
+                    done += 1
+                    current = done
+                if on_progress is not None:
+                    on_progress(current, total)
+
+    if workers is None:
+        workers = min(8, os.cpu_count() or 1)
+    buckets = _split_members(files, max(1, workers))
+    with ThreadPoolExecutor(max_workers=max(1, len(buckets))) as executor:
+        for future in [executor.submit(extract_bucket, b) for b in buckets]:
+            future.result()
+
+
+class StreamPipe:
+    """
+    Read-only file object fed with chunks from another thread.
+
+    The producer calls `write()`, or `await write_async()` on the event loop,
+    and finally `close()` (or `abort()` on error), the consumer reads it like
+    a normal stream, e.g. `tarfile.open(fileobj=pipe, mode="r|gz")`.
+
+    At most `max_chunks` chunks are buffered, writes wait until the reader
+    catches up, so a slow consumer holds back the producer instead of the
+    stream piling up in memory. Writes raise `BrokenPipeError` once the
+    reader has stopped.
+    """
+
+    def __init__(self, max_chunks: int = 64):
+        # `None` only wakes the reader, see `close()` and `abort()`
+        self._queue: queue.Queue[bytes | None] = queue.Queue(max_chunks)
+        self._buffer = memoryview(b"")
+        self._eof = False
+        self._closed = False
+        self._error: BaseException | None = None
+        self._broken = False
+        # Set while `write_async()` waits for space
+        self._space: asyncio.Future | None = None
+
+    def write(self, data: bytes):
+        """Queue a chunk, block while the pipe is full."""
+        if self._broken:
+            raise BrokenPipeError("The reader of the stream has stopped.")
+        if data:
+            self._queue.put(bytes(data))
+
+    async def write_async(self, data: bytes):
+        """Queue a chunk, wait for space without blocking the event loop."""
+        chunk = bytes(data)
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._broken:
+                raise BrokenPipeError("The reader of the stream has stopped.")
+            if not chunk:
+                return
+            waiter = self._space = loop.create_future()
+            try:
+                # After the waiter is set, so a read in between wakes it
+                self._queue.put_nowait(chunk)
+                return
+            except queue.Full:
+                await waiter
+            finally:
+                self._space = None
+
+    def close(self):
+        """End the stream after the queued chunks, never blocks."""
+        self._closed = True
+        self._wake_reader()
+
+    def abort(self, error: BaseException | None = None):
+        """Fail the next read with `error`, never blocks."""
+        self._error = error or EOFError("The stream was aborted.")
+        self._wake_reader()
+
+    def close_reader(self):
+        """Called by the consumer when it stops reading, drops the queued chunks."""
+        self._broken = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._wake_writer()
+
+    def _wake_reader(self):
+        with suppress(queue.Full):
+            # A full queue wakes the reader anyway
+            self._queue.put_nowait(None)
+
+    def _wake_writer(self):
+        waiter = self._space
+        if waiter is not None:
+            waiter.get_loop().call_soon_threadsafe(_set_done, waiter)
+
+    def _next_chunk(self) -> bytes | None:
+        while True:
+            if self._error is not None:
+                raise self._error
+            if self._closed and self._queue.empty():
+                return None
+            item = self._queue.get()
+            self._wake_writer()
+            if item is not None:
+                return item
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        while size < 0 or size > 0:
+            if not self._buffer:
+                if self._eof:
+                    break
+                try:
+                    item = self._next_chunk()
+                except BaseException:
+                    self._eof = True
+                    raise
+                if item is None:
+                    self._eof = True
+                    break
+                self._buffer = memoryview(item)
+            n = len(self._buffer) if size < 0 else min(size, len(self._buffer))
+            chunks.append(self._buffer[:n].tobytes())
+            self._buffer = self._buffer[n:]
+            if size > 0:
+                size -= n
+        return b"".join(chunks)
+
+
+def _set_done(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def extract_tar_stream(pipe: StreamPipe, dest: str | Path):
+    """Extract a `.tar.gz` stream while it is being written to `pipe`."""
+    try:
+        with tarfile.open(fileobj=pipe, mode="r|gz") as tar_ref:
+            tar_ref.extractall(
+                dest, members=_cancellable_members(tar_ref), filter="data"
+            )
+        # Consume the trailing padding, so the producer does not see a broken pipe
+        while pipe.read(64 * 1024):
+            pass
+    finally:
+        pipe.close_reader()
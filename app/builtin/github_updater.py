@@ -1,12 +1,24 @@
-from glom import glom
-from httpx import AsyncClient
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from singleton_decorator import singleton
 
 
-from app.builtin.update import Updater, Version, get_arch, get_sysname
+from app.builtin.update import (
+    HTTP2_AVAILABLE,
+    Updater,
+    Version,
+    get_arch,
+    get_sysname,
+    newest_in_channel,
+)
+from app.builtin.checksum import CHECKSUM_SUFFIX
 from app.builtin.paths import AppPaths
 
+if TYPE_CHECKING:
+    from httpx import AsyncClient
+
 
 @singleton
 class GithubUpdater(Updater):
@@ -15,60 +27,109 @@ class GithubUpdater(Updater):
     app_name: str = "App"
     timeout = 5
     token = None
+    per_page = 100
 
     _headers = None
 
     def create_async_client(self) -> AsyncClient:
+        from httpx import AsyncClient
+
         if not self._headers:
             headers = {"Accept": "application/vnd.github+json"}
             if self.token:
                 headers["Authorization"] = f"token {self.token}"
             self._headers = headers
         return AsyncClient(
-            proxy=self.proxy, headers=self._headers, timeout=self.timeout
+            proxy=self.proxy,
+            headers=self._headers,
+            timeout=self.timeout,
+            http2=HTTP2_AVAILABLE,
         )
 
-    async def fetch(self):
-        async with self.create_async_client() as client:
-            r = await client.get(
-                url=f"{self.base_url}/repos/{self.project_name}/releases",
-                params={"pre_page": "100", "page": "1"},
-                follow_redirects=True
+    async def iter_release_pages(self):
+        """Yield pages of releases, following the `Link: rel="next"` header lazily."""
+        url = f"{self.base_url}/repos/{self.project_name}/releases"
+        params = {"per_page": self.per_page}
+        while url:
+            r = await self.metadata_cache.get_json(
+                self.client, url=url, params=params, follow_redirects=True
             )
-            r.raise_for_status()
-            releases = []
-            for release in r.json():
-                version = Version(release["tag_name"])
-                if version.release_type == self.release_type:
-                    releases.append(release)
-            latest_release = max(
-                releases, key=lambda x: Version(x["tag_name"]), default=None
+            yield r.data
+            url = r.links.get("next")
+            # The next link already carries the query
+            params = None
+
+    async def find_latest_release(self) -> tuple[dict | None, Version | None]:
+        """
+        Get the newest release of `release_type` and its version.
+
+        GitHub lists releases by creation date, not by version, e.g. a patch
+        for an old major version is listed before newer versions. The scan goes
+        on while a page has a version at least as new as the best match so far,
+        and stops after a page on which every version is older, or on which
+        no release is newer than the current version.
+        """
+        best_release = None
+        best_version = None
+        async for page in self.iter_release_pages():
+            tags = [release["tag_name"] for release in page]
+            newest = newest_in_channel(tags, self.release_type)
+            if newest is not None:
+                index, version = newest
+                if best_version is None or version > best_version:
+                    best_release, best_version = page[index], version
+            page_max = max(map(Version, tags), default=None)
+            if page_max is None or page_max <= self.current_version:
+                break
+            if best_version is not None and page_max < best_version:
+                break
+        return best_release, best_version
+
+    async def fetch(self):
+        from glom import glom
+
+        client = self.client
+        latest_release, latest_version = await self.find_latest_release()
+        if latest_release is None:
+            # Does have any release for this channel
+            self.remote_version = Version("0.0.0.0")
+            return
+        self.remote_version = latest_version
+        self.description = latest_release["body"]
+
+        arch = get_arch()
+        sysname = get_sysname()
+        package_name = f"{self.app_name}-{sysname}-{arch}"
+
+        delta_prefix = self._delta_asset_prefix(package_name)
+        paths = AppPaths()
+
+        self.download_url = None
+        self.delta_url = None
+        checksum_urls = {}
+        for assets in glom(latest_release, "assets", default={}):
+            name = assets["name"]
+            if name.endswith(CHECKSUM_SUFFIX):
+                checksum_urls[name] = assets["browser_download_url"]
+            elif name.startswith(delta_prefix):
+                self.delta_url = assets["browser_download_url"]
+                self.delta_filename = f"{paths.update_dir}/{name}"
+            elif (
+                self.download_url is None
+                and package_name in name
+                and "-delta-" not in name
+            ):
+                self.download_url = assets["browser_download_url"]
+                package_name = name
+        self.checksum_url = checksum_urls.get(f"{package_name}{CHECKSUM_SUFFIX}")
+
+        if self.download_url is None:
+            raise FileNotFoundError(
+                f"Package {package_name} not found in release assets."
             )
-            if latest_release is None:
-                # Does have any release for this channel
-                self.remote_version = Version("0.0.0.0")
-                return
-            self.remote_version = Version(latest_release["tag_name"])
-            self.description = latest_release["body"]
-
-            arch = get_arch()
-            sysname = get_sysname()
-            package_name = f"{self.app_name}-{sysname}-{arch}"
-
-            self.download_url = None
-            for assets in glom(latest_release, "assets", default={}):
-                if package_name in assets["name"]:
-                    package_name = assets["name"]
-                    self.download_url = assets["browser_download_url"]
-                    break
-
-            if self.download_url is None:
-                raise FileNotFoundError(
-                    f"Package {package_name} not found in release assets."
-                )
-
-            r = await client.head(url=self.download_url, follow_redirects=True)
-            r.raise_for_status()
-
-            paths = AppPaths()
-            self.filename = f"{paths.update_dir}/{package_name}"
+
+        r = await client.head(url=self.download_url, follow_redirects=True)
+        r.raise_for_status()
+        self._read_head_response(r)
+
+        self.filename = f"{paths.update_dir}/{package_name}"
@@ -1,14 +1,26 @@
-import os
-from urllib.parse import urlparse
+from __future__ import annotations
 
-from glom import glom
-from httpx import AsyncClient
+import json
+import os
+from typing import TYPE_CHECKING
+from urllib.parse import quote, urlparse
 
 from singleton_decorator import singleton
 
-from app.builtin.update import Updater, Version, get_arch, get_sysname
+from app.builtin.update import (
+    HTTP2_AVAILABLE,
+    Updater,
+    Version,
+    get_arch,
+    get_sysname,
+    newest_in_channel,
+)
+from app.builtin.checksum import CHECKSUM_SUFFIX
 from app.builtin.paths import AppPaths
 
+if TYPE_CHECKING:
+    from httpx import AsyncClient
+
 
 @singleton
 class GitlabUpdater(Updater):
@@ -17,73 +29,153 @@ class GitlabUpdater(Updater):
     app_name: str = "App"
     timeout = 5
     token = None
+    # Skip the project search, see `resolve_project_id()`
+    project_id: int | str | None = None
+    address_by_path = False
 
     _headers = None
 
     def create_async_client(self) -> AsyncClient:
+        from httpx import AsyncClient
+
         if not self._headers:
             headers = {}
             if self.token:
                 headers["PRIVATE-TOKEN"] = self.token
             self._headers = headers
         return AsyncClient(
-            proxy=self.proxy, headers=self._headers, timeout=self.timeout
+            proxy=self.proxy,
+            headers=self._headers,
+            timeout=self.timeout,
+            http2=HTTP2_AVAILABLE,
+        )
+
+    def _project_key(self) -> str:
+        return f"{self.base_url}/{self.project_name}"
+
+    def _load_project_ids(self) -> dict[str, int]:
+        try:
+            with open(self._project_ids_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_project_ids(self, project_ids: dict[str, int]):
+        with open(self._project_ids_file, "w", encoding="utf-8") as f:
+            json.dump(project_ids, f)
+
+    def _forget_project_id(self) -> bool:
+        """Drop the persisted project ID, return False if there was none."""
+        project_ids = self._load_project_ids()
+        if project_ids.pop(self._project_key(), None) is None:
+            return False
+        self._save_project_ids(project_ids)
+        return True
+
+    @property
+    def _project_ids_file(self):
+        return AppPaths().base_dir / "gitlab_projects.json"
+
+    async def resolve_project_id(self) -> int | str:
+        """
+        Get the ID used in `/projects/:id` API paths.
+        Uses `project_id` if set, the URL-encoded `project_name` if
+        `address_by_path` is set, otherwise searches the project once and
+        persists the ID in the app data directory.
+        """
+        if self.project_id is not None:
+            return self.project_id
+        if self.address_by_path:
+            return quote(self.project_name, safe="")
+
+        key = self._project_key()
+        project_ids = self._load_project_ids()
+        if key in project_ids:
+            return project_ids[key]
+
+        r = await self.client.get(
+            url=f"{self.base_url}/api/v4/projects",
+            params={"search": self.project_name, "search_namespaces": "true"},
         )
+        r.raise_for_status()
+        projects = r.json()
+        if not projects:
+            raise FileNotFoundError(
+                f"Project {self.project_name} not found on GitLab: {self.base_url}"
+            )
+        project_ids[key] = projects[0]["id"]
+        self._save_project_ids(project_ids)
+        return project_ids[key]
 
     async def fetch(self):
-        async with self.create_async_client() as client:
-            r = await client.get(
-                url=f"{self.base_url}/api/v4/projects",
-                params={"search": self.project_name, "search_namespaces": "true"},
+        from glom import glom
+        from httpx import HTTPStatusError
+
+        client = self.client
+        project_id = await self.resolve_project_id()
+        try:
+            r = await self.metadata_cache.get_json(
+                client,
+                url=f"{self.base_url}/api/v4/projects/{project_id}/releases",
+                params={"per_page": 1},
             )
-            r.raise_for_status()
-            projects = r.json()
-            if not projects:
-                raise FileNotFoundError(
-                    f"Project {self.project_name} not found on GitLab: {self.base_url}"
-                )
-            project = projects[0]
-            project_id = project["id"]
-            r = await client.get(
+        except HTTPStatusError as e:
+            if e.response.status_code != 404 or not self._forget_project_id():
+                raise
+            # The cached project ID is stale, e.g. the project was recreated
+            project_id = await self.resolve_project_id()
+            r = await self.metadata_cache.get_json(
+                client,
                 url=f"{self.base_url}/api/v4/projects/{project_id}/releases",
                 params={"per_page": 1},
             )
-            r.raise_for_status()
-
-            releases = []
-            for release in r.json():
-                version = Version(release["tag_name"])
-                if version.release_type == self.release_type:
-                    releases.append(release)
-            latest_release = max(
-                releases, key=lambda x: Version(x["tag_name"]), default=None
+
+        newest = newest_in_channel(
+            [release["tag_name"] for release in r.data], self.release_type
+        )
+        if newest is None:
+            # Does have any release for this channel
+            self.remote_version = Version("0.0.0.0")
+            return
+
+        index, self.remote_version = newest
+        latest_release = r.data[index]
+        self.description = latest_release["description"]
+
+        arch = get_arch()
+        sysname = get_sysname()
+        package_name = f"{self.app_name}-{sysname}-{arch}"
+
+        delta_prefix = self._delta_asset_prefix(package_name)
+        paths = AppPaths()
+
+        self.download_url = None
+        self.delta_url = None
+        checksum_urls = {}
+        for link in glom(latest_release, "assets.links", default={}):
+            name = link["name"]
+            if name.endswith(CHECKSUM_SUFFIX):
+                checksum_urls[name] = link["url"]
+            elif name.startswith(delta_prefix):
+                self.delta_url = link["url"]
+                self.delta_filename = f"{paths.update_dir}/{name}"
+            elif (
+                self.download_url is None
+                and package_name in name
+                and "-delta-" not in name
+            ):
+                self.download_url = link["url"]
+                package_name = name
+        self.checksum_url = checksum_urls.get(f"{package_name}{CHECKSUM_SUFFIX}")
+
+        if self.download_url is None:
+            raise FileNotFoundError(
+                f"Package {package_name} not found in release assets."
             )
-            if latest_release is None:
-                # Does have any release for this channel
-                self.remote_version = Version("0.0.0.0")
-                return
-
-            self.remote_version = Version(latest_release["tag_name"])
-            self.description = latest_release["description"]
-
-            arch = get_arch()
-            sysname = get_sysname()
-            package_name = f"{self.app_name}-{sysname}-{arch}"
-
-            self.download_url = None
-            for link in glom(latest_release, "assets.links", default={}):
-                if package_name in link["name"]:
-                    package_name = link["name"]
-                    self.download_url = link["url"]
-                    break
-            if self.download_url is None:
-                raise FileNotFoundError(
-                    f"Package {package_name} not found in release assets."
-                )
-
-            r = await client.head(url=self.download_url)
-            r.raise_for_status()
-
-            path = urlparse(self.download_url).path
-            paths = AppPaths()
-            self.filename = f"{paths.update_dir}/{os.path.basename(path)}"
+
+        r = await client.head(url=self.download_url)
+        r.raise_for_status()
+        self._read_head_response(r)
+
+        path = urlparse(self.download_url).path
+        self.filename = f"{paths.update_dir}/{os.path.basename(path)}"
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlencode
+
+if TYPE_CHECKING:
+    from httpx import AsyncClient
+
+
+class CachedResponse:
+    def __init__(self, data: Any, links: dict[str, str], from_cache: bool):
+        self.data = data
+        # rel -> url, from the `Link` header
+        self.links = links
+        self.from_cache = from_cache
+
+
+class MetadataCache:
+    """
+    Persistent cache for JSON API responses.
+
+    Stores the parsed body with its `ETag`/`Last-Modified` and revalidates it
+    with a conditional request, a `304 Not Modified` reuses the cached body.
+    Within `ttl` seconds of the last validation no request is sent at all.
+    """
+
+    def __init__(self, file: str | Path, ttl: float = 0):
+        self.file = Path(file)
+        self.ttl = ttl
+        self._entries: dict[str, dict] = {}
+        try:
+            with open(self.file, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _key(url: str, params: dict | None) -> str:
+        if not params:
+            return url
+        return f"{url}?{urlencode(sorted((k, str(v)) for k, v in params.items()))}"
+
+    def _save(self):
+        tmp_file = self.file.with_name(self.file.name + ".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_file, self.file)
+
+    def clear(self):
+        self._entries = {}
+        self.file.unlink(missing_ok=True)
+
+    async def get_json(
+        self, client: AsyncClient, url: str, params: dict | None = None, **kwargs
+    ) -> CachedResponse:
+        key = self._key(url, params)
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry is not None and now - entry["validated_at"] < self.ttl:
+            return CachedResponse(entry["data"], entry["links"], True)
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        r = await client.get(url=url, params=params, headers=headers, **kwargs)
+        if r.status_code == 304 and entry is not None:
+            entry["validated_at"] = now
+            self._save()
+            return CachedResponse(entry["data"], entry["links"], True)
+        r.raise_for_status()
+
+        data = r.json()
+        links = {
+            rel: link["url"] for rel, link in r.links.items() if "url" in link
+        }
+        self._entries[key] = {
+            "etag": r.headers.get("etag"),
+            "last_modified": r.headers.get("last-modified"),
+            "validated_at": now,
+            "data": data,
+            "links": links,
+        }
+        self._save()
+        return CachedResponse(data, links, False)
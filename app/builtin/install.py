@@ -0,0 +1,279 @@
+"""
+Crash-safe installation of an extracted package over the installed directory.
+
+Replaced and removed items are first moved into a staging directory
+(`<target>/.update-backup`) and every step is recorded in a journal there
+before it is taken.
+New items are moved in with `os.replace` when source and target are on the
+same filesystem, and copied with a thread pool otherwise.
+If anything fails, or a previous install crashed, the journal is rolled back.
+`recover_install()` is called at startup, so a crash in the middle of an
+install does not leave a broken tree until the next update.
+The whole install holds a lock file next to the backup directory, recovery
+skips a journal whose install is still running in another process.
+With a manifest in the package, only the changed files and symlinks are
+touched.
+"""
+
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from PySide6.QtCore import QLockFile
+
+from app.builtin.manifest import (
+    MANIFEST_NAME,
+    FileEntry,
+    build_manifest,
+    dump_manifest,
+    load_manifest,
+    same_content,
+)
+
+BACKUP_DIR_NAME = ".update-backup"
+_JOURNAL_NAME = "journal.json"
+INSTALL_LOCK_NAME = ".update-install.lock"
+
+
+class InstallError(RuntimeError):
+    pass
+
+
+def _remove_path(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    elif path.exists() or path.is_symlink():
+        path.unlink()
+
+
+def _same_device(a: Path, b: Path) -> bool:
+    try:
+        return os.lstat(a).st_dev == os.stat(b).st_dev
+    except OSError:
+        return False
+
+
+def copy_tree_parallel(src: str | Path, dst: str | Path, workers: int | None = None):
+    """Copy a file or directory tree, files are copied with a thread pool."""
+    src = Path(src)
+    dst = Path(dst)
+    if src.is_symlink() or not src.is_dir():
+        shutil.copy2(src, dst, follow_symlinks=False)
+        return
+
+    files = []
+    for root, dirs, filenames in os.walk(src):
+        rel_root = Path(root).relative_to(src)
+        (dst / rel_root).mkdir(parents=True, exist_ok=True)
+        for name in dirs:
+            if (Path(root) / name).is_symlink():
+                files.append(rel_root / name)
+        files.extend(rel_root / name for name in filenames)
+
+    if workers is None:
+        workers = min(8, (os.cpu_count() or 1) * 2)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(shutil.copy2, src / rel, dst / rel, follow_symlinks=False)
+            for rel in files
+        ]
+        for future in futures:
+            future.result()
+    shutil.copystat(src, dst)
+
+
+class TreeInstaller:
+    # Seconds to wait for another install or a recovery of the same target
+    lock_timeout = 30
+
+    def __init__(self, source_dir: str | Path, target_dir: str | Path):
+        self.source_dir = Path(source_dir)
+        self.target_dir = Path(target_dir)
+        self.backup_dir = self.target_dir / BACKUP_DIR_NAME
+        self.journal_file = self.backup_dir / _JOURNAL_NAME
+        # Outside the backup directory, which is removed on commit
+        self._lock = QLockFile(str(self.target_dir / INSTALL_LOCK_NAME))
+        # Only a dead owner makes the lock stale, an install can take minutes
+        self._lock.setStaleLockTime(0)
+        # [kind, relative path, slot], kind is "backup" (old item moved to
+        # `backup_dir/slot`) or "install" (new item placed in target)
+        self._journal: list[list[str]] = []
+
+    def _save_journal(self):
+        tmp_file = self.journal_file.with_name(_JOURNAL_NAME + ".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self._journal, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.journal_file)
+
+    def _record(self, kind: str, rel: str) -> Path:
+        slot = str(len(self._journal))
+        self._journal.append([kind, rel, slot])
+        self._save_journal()
+        return self.backup_dir / slot
+
+    def _backup(self, rel: str):
+        """Move an installed item into the backup directory."""
+        target = self.target_dir / rel
+        if not target.exists() and not target.is_symlink():
+            return
+        backup = self._record("backup", rel)
+        os.replace(target, backup)
+
+    def _place(self, rel: str):
+        """Move or copy an item of the source directory to the target."""
+        source = self.source_dir / rel
+        target = self.target_dir / rel
+        self._record("install", rel)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if _same_device(source, self.target_dir):
+            try:
+                os.replace(source, target)
+                return
+            except OSError:
+                # e.g. files of the running executable are locked on Windows
+                pass
+        copy_tree_parallel(source, target)
+
+    def try_lock(self, timeout: float = 0) -> bool:
+        """Take the install lock of the target, wait up to `timeout` seconds."""
+        return self._lock.tryLock(int(timeout * 1000))
+
+    def unlock(self):
+        self._lock.unlock()
+
+    @contextmanager
+    def _locked(self):
+        if not self.try_lock(self.lock_timeout):
+            raise InstallError(f"Another install into {self.target_dir} is running")
+        try:
+            yield
+        finally:
+            self.unlock()
+
+    def _begin(self):
+        self.recover()
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        self._journal = []
+        self._save_journal()
+
+    def _commit(self):
+        # Committed, a crash while removing the backup must not roll back
+        self.journal_file.unlink()
+        shutil.rmtree(self.backup_dir, ignore_errors=True)
+
+    def install(self, remove: list[str] | None = None):
+        """
+        Replace the target with the items of the source directory,
+        `remove` lists additional relative paths to delete from the target.
+        """
+        with self._locked():
+            self._begin()
+            try:
+                for rel in remove or []:
+                    self._backup(rel)
+                for item in sorted(self.source_dir.iterdir()):
+                    if item.name == BACKUP_DIR_NAME:
+                        continue
+                    self._backup(item.name)
+                    self._place(item.name)
+            except Exception as e:
+                self.rollback()
+                raise InstallError(f"Failed to install update: {e}") from e
+            self._commit()
+
+    def install_changed(self, remove: list[str] | None = None):
+        """
+        Install only the files that differ from the target, according to the
+        manifest shipped in the source directory. Files of the previous
+        manifest that are gone from the new one are removed.
+        The target keeps a manifest with its own mtimes, so the next update
+        only has to hash files that were modified after the install.
+        """
+        new_files = load_manifest(self.source_dir / MANIFEST_NAME)
+        old_files: dict[str, FileEntry] = {}
+        try:
+            old_files = load_manifest(self.target_dir / MANIFEST_NAME)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with self._locked():
+            self._begin()
+            try:
+                for rel in remove or []:
+                    self._backup(rel)
+                for rel in old_files:
+                    if rel not in new_files:
+                        self._backup(rel)
+                current = build_manifest(
+                    self.target_dir, list(new_files), previous=old_files
+                )
+                for rel, entry in new_files.items():
+                    if same_content(current.get(rel), entry):
+                        continue
+                    self._backup(rel)
+                    self._place(rel)
+
+                self._backup(MANIFEST_NAME)
+                self._record("install", MANIFEST_NAME)
+                installed = {}
+                for rel, entry in new_files.items():
+                    if "symlink" in entry:
+                        installed[rel] = entry
+                        continue
+                    st = os.stat(self.target_dir / rel)
+                    installed[rel] = {
+                        "size": st.st_size,
+                        "mtime": st.st_mtime,
+                        "sha256": entry["sha256"],
+                    }
+                dump_manifest(installed, self.target_dir / MANIFEST_NAME)
+            except Exception as e:
+                self.rollback()
+                raise InstallError(f"Failed to install update: {e}") from e
+            self._commit()
+
+    def rollback(self):
+        """Undo the journaled steps in reverse order."""
+        for kind, rel, slot in reversed(self._journal):
+            target = self.target_dir / rel
+            backup = self.backup_dir / slot
+            if kind == "install":
+                _remove_path(target)
+            elif backup.exists() or backup.is_symlink():
+                _remove_path(target)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(backup, target)
+        self._journal = []
+        shutil.rmtree(self.backup_dir, ignore_errors=True)
+
+    def recover(self):
+        """Roll back an install that was interrupted by a crash."""
+        if not self.journal_file.is_file():
+            shutil.rmtree(self.backup_dir, ignore_errors=True)
+            return
+        with open(self.journal_file, "r", encoding="utf-8") as f:
+            self._journal = json.load(f)
+        self.rollback()
+
+
+def recover_install(target_dir: str | Path) -> bool:
+    """
+    Roll back an install into `target_dir` that was interrupted by a crash.
+    Only a stat if there is nothing to recover, return True if there was.
+    The journal of an install that is still running is left alone.
+    """
+    installer = TreeInstaller(target_dir, target_dir)
+    if not installer.backup_dir.exists():
+        return False
+    if not installer.try_lock():
+        return False
+    try:
+        installer.recover()
+    finally:
+        installer.unlock()
+    return True
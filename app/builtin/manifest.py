@@ -0,0 +1,132 @@
+"""
+Package manifest: size, mtime and SHA-256 of every file in a package,
+the target of every symlink (e.g. `.so` version links, macOS frameworks).
+
+    {"version": 3, "files": {
+        "<path>": {"size": 0, "mtime": 0.0, "sha256": "..."},
+        "<link>": {"symlink": "<target>"}
+    }}
+
+Create one for a build directory with:
+
+    python -m app.builtin.manifest <dir>
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 3
+# Version 2 has no symlink entries, it is read as is
+_READABLE_VERSIONS = (2, MANIFEST_VERSION)
+
+FileEntry = dict[str, int | float | str]
+
+
+def hash_file(path: str | Path) -> str:
+    """Get the SHA-256 hex digest of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def iter_files(root: str | Path):
+    """
+    Yield every regular file and symlink below `root` as a relative POSIX
+    path, symlinked directories are not followed.
+    """
+    root = Path(root)
+    for path in sorted(root.rglob("*")):
+        if path.is_symlink() or path.is_file():
+            rel = path.relative_to(root).as_posix()
+            if rel != MANIFEST_NAME:
+                yield rel
+
+
+def same_content(a: FileEntry | None, b: FileEntry) -> bool:
+    """Return True if both entries have the same hash or the same link target."""
+    return (
+        a is not None
+        and a.get("sha256") == b.get("sha256")
+        and a.get("symlink") == b.get("symlink")
+    )
+
+
+def file_entry(path: str | Path, previous: FileEntry | None = None) -> FileEntry:
+    """
+    Stat and hash a file, the hash of `previous` is reused
+    if size and mtime did not change. A symlink is recorded with its target.
+    """
+    if os.path.islink(path):
+        return {"symlink": os.readlink(path)}
+    st = os.stat(path)
+    if (
+        previous is not None
+        and previous.get("size") == st.st_size
+        and previous.get("mtime") == st.st_mtime
+    ):
+        return previous
+    return {"size": st.st_size, "mtime": st.st_mtime, "sha256": hash_file(path)}
+
+
+def build_manifest(
+    root: str | Path,
+    paths: list[str] | None = None,
+    previous: dict[str, FileEntry] | None = None,
+    workers: int | None = None,
+) -> dict[str, FileEntry]:
+    """
+    Get the entries of `paths` (default: every file) below `root`,
+    files are hashed in parallel. Missing paths are skipped.
+    """
+    root = Path(root)
+    if paths is None:
+        paths = list(iter_files(root))
+    previous = previous or {}
+    if workers is None:
+        workers = min(8, os.cpu_count() or 1)
+
+    def entry(rel: str) -> FileEntry | None:
+        path = root / rel
+        if not path.is_symlink() and not path.is_file():
+            return None
+        return file_entry(path, previous.get(rel))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        entries = executor.map(entry, paths)
+        return {rel: e for rel, e in zip(paths, entries) if e is not None}
+
+
+def parse_manifest(data: dict) -> dict[str, FileEntry]:
+    if data.get("version") not in _READABLE_VERSIONS:
+        raise ValueError(f"Unsupported manifest version: {data.get('version')}")
+    return data["files"]
+
+
+def load_manifest(file: str | Path) -> dict[str, FileEntry]:
+    with open(file, "r", encoding="utf-8") as f:
+        return parse_manifest(json.load(f))
+
+
+def dump_manifest(files: dict[str, FileEntry], file: str | Path):
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the manifest of a package.")
+    parser.add_argument("root", help="Package directory")
+    parser.add_argument("-o", "--output", help=f"Output file, default: <root>/{MANIFEST_NAME}")
+    args = parser.parse_args()
+    output = args.output or Path(args.root) / MANIFEST_NAME
+    dump_manifest(build_manifest(args.root), output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+
+class Progress:
+    def __init__(self, done: int, total: int, rate: float, eta: float | None):
+        self.done = done
+        # 0 if unknown
+        self.total = total
+        # units per second, averaged over `ProgressReporter.window`
+        self.rate = rate
+        # seconds left, None if the total or the rate is unknown
+        self.eta = eta
+
+    @property
+    def fraction(self) -> float | None:
+        if self.total <= 0:
+            return None
+        return min(1.0, self.done / self.total)
+
+
+class ProgressReporter:
+    """
+    Coalesce progress updates to at most `fps` callbacks per second.
+
+    `update()` is cheap and thread-safe, call it for every chunk. The callback
+    runs on the thread that calls `update()`, wrap it with
+    `app.builtin.asyncio.threadsafe_callback` to run it on the Qt thread.
+    The last update is always delivered by `finish()`.
+    """
+
+    # Seconds of samples for the throughput moving average
+    window = 3.0
+
+    def __init__(self, callback: Callable[[Progress], None], fps: float = 30):
+        self.callback = callback
+        self.interval = 1 / fps
+        self.clock: Callable[[], float] = time.monotonic
+        self._lock = threading.Lock()
+        self._samples: deque[tuple[float, int]] = deque()
+        self._last_emit = float("-inf")
+        self._done = 0
+        self._total = 0
+        self._pending = False
+
+    def reset(self):
+        """Start over, e.g. for the next stage of a task."""
+        with self._lock:
+            self._samples.clear()
+            self._last_emit = float("-inf")
+            self._done = 0
+            self._total = 0
+            self._pending = False
+
+    def update(self, done: int, total: int = 0):
+        now = self.clock()
+        with self._lock:
+            self._done = done
+            self._total = total
+            if now - self._last_emit < self.interval:
+                self._pending = True
+                return
+            progress = self._snapshot(now)
+        self.callback(progress)
+
+    def finish(self):
+        """Deliver the last coalesced update, if any."""
+        with self._lock:
+            if not self._pending:
+                return
+            progress = self._snapshot(self.clock())
+        self.callback(progress)
+
+    def _snapshot(self, now: float) -> Progress:
+        self._last_emit = now
+        self._pending = False
+        samples = self._samples
+        samples.append((now, self._done))
+        while len(samples) > 2 and now - samples[0][0] > self.window:
+            samples.popleft()
+
+        rate = 0.0
+        start_time, start_done = samples[0]
+        if now > start_time:
+            rate = max(0.0, (self._done - start_done) / (now - start_time))
+        eta = None
+        if self._total > 0 and rate > 0:
+            eta = max(0, self._total - self._done) / rate
+        return Progress(self._done, self._total, rate, eta)
+
+
+def format_size(size: float) -> str:
+    if size < 1024:
+        return f"{size:.0f} B"
+    for unit in ("KiB", "MiB"):
+        size /= 1024
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+    return f"{size / 1024:.1f} GiB"
+
+
+def format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,112 @@
+"""
+Qt resources from external `.rcc` files.
+
+The generated `resources/resource.py` module embeds every asset in a bytes
+literal, importing it unmarshals all of them onto the Python heap.
+`ResourceLoader` registers one compiled `<group>.rcc` file per group with
+`QResource.registerResource` instead, Qt maps it into memory. A group is
+registered the first time it is required, the embedded module is imported
+as a fallback if the file is missing, e.g. in onefile builds.
+
+Groups follow the assets directory: files at its top level are "icons",
+every subdirectory is a group of its own ("i18n"). The release builds compile
+the files after `pyside-cli build --stage rc` and ship them as data files:
+
+    python -m app.builtin.resources app/assets app/resources
+"""
+
+import argparse
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Callable
+from xml.sax.saxutils import escape
+
+from PySide6.QtCore import QResource
+
+ROOT_GROUP = "icons"
+RCC_SUFFIX = ".rcc"
+
+
+class ResourceLoader:
+    def __init__(self, rcc_dir: str | Path, fallback: Callable[[], object]):
+        self.rcc_dir = Path(rcc_dir)
+        # Imports the embedded module, which registers every group
+        self.fallback = fallback
+        self.registered: set[str] = set()
+        self.fallback_used = False
+
+    def require(self, group: str):
+        """Make the resources of `group` available under `:/`."""
+        if self.fallback_used or group in self.registered:
+            return
+        file = self.rcc_dir / f"{group}{RCC_SUFFIX}"
+        if file.is_file() and QResource.registerResource(str(file)):
+            self.registered.add(group)
+            return
+        self.fallback()
+        self.fallback_used = True
+
+
+def _import_app_resources():
+    # A static import, so the build includes the module
+    import app.resources.resource  # type: ignore # noqa: F401
+
+
+APP_RESOURCES = ResourceLoader(
+    Path(__file__).resolve().parent.parent / "resources", _import_app_resources
+)
+
+
+def collect_groups(assets_dir: str | Path) -> dict[str, list[Path]]:
+    """Map each group to its files, relative to `assets_dir`."""
+    assets_dir = Path(assets_dir)
+    groups: dict[str, list[Path]] = {}
+    for path in sorted(assets_dir.rglob("*")):
+        if not path.is_file():
+            continue
+        relative = path.relative_to(assets_dir)
+        group = relative.parts[0].lower() if len(relative.parts) > 1 else ROOT_GROUP
+        groups.setdefault(group, []).append(relative)
+    return groups
+
+
+def build_rcc(assets_dir: str | Path, output_dir: str | Path) -> list[Path]:
+    """Compile one binary `.rcc` file per group of `assets_dir` into `output_dir`."""
+    rcc = shutil.which("pyside6-rcc")
+    if rcc is None:
+        raise FileNotFoundError("pyside6-rcc not found")
+    assets_dir = Path(assets_dir).resolve()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    outputs = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for group, files in collect_groups(assets_dir).items():
+            qrc = Path(tmp_dir) / f"{group}.qrc"
+            entries = "\n".join(
+                f'  <file alias="{escape(file.as_posix())}">'
+                f"{escape((assets_dir / file).as_posix())}</file>"
+                for file in files
+            )
+            qrc.write_text(
+                f"<!DOCTYPE RCC>\n<RCC version=\"1.0\">\n<qresource>\n{entries}\n</qresource>\n</RCC>\n",
+                encoding="utf-8",
+            )
+            output = output_dir / f"{group}{RCC_SUFFIX}"
+            subprocess.run([rcc, "--binary", str(qrc), "-o", str(output)], check=True)
+            outputs.append(output)
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile assets into one .rcc file per group.")
+    parser.add_argument("assets_dir", help="Assets directory, e.g. app/assets")
+    parser.add_argument("output_dir", help="Directory of the .rcc files, e.g. app/resources")
+    args = parser.parse_args()
+    for output in build_rcc(args.assets_dir, args.output_dir):
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
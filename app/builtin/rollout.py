@@ -0,0 +1,41 @@
+"""
+Staged rollout of releases.
+
+Every install gets a random ID, stored in `install_id` in the app data
+directory. Hashing it with the release version puts the install at a
+fixed position in [0, 100), the release is offered if that position is
+below the rollout percentage. Raising the percentage only adds installs,
+and every release shuffles which installs come first.
+"""
+
+import hashlib
+import uuid
+from pathlib import Path
+
+INSTALL_ID_FILE = "install_id"
+
+
+def load_install_id(base_dir: str | Path) -> str:
+    """Read the install ID, create it on first use."""
+    file = Path(base_dir) / INSTALL_ID_FILE
+    try:
+        install_id = file.read_text(encoding="utf-8").strip()
+        if install_id:
+            return install_id
+    except OSError:
+        pass
+    install_id = uuid.uuid4().hex
+    file.write_text(install_id, encoding="utf-8")
+    return install_id
+
+
+def rollout_position(install_id: str, version: str) -> float:
+    """Position of the install in [0, 100) for this version."""
+    digest = hashlib.sha256(f"{install_id}:{version}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 * 100
+
+
+def in_rollout(install_id: str, version: str, percentage: float) -> bool:
+    if percentage >= 100:
+        return True
+    return rollout_position(install_id, version) < percentage
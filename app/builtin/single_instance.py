@@ -0,0 +1,128 @@
+"""
+Single running instance per user.
+
+The first launch takes a lock file and listens on a local socket (a named
+pipe on Windows), a second launch finds the lock taken, sends its arguments
+over the socket and exits. The check only needs QtCore and the standard
+library, so it runs before the QApplication and the main window are imported:
+
+    instance = SingleInstance()
+    if not instance.acquire():
+        instance.forward(sys.argv[1:])
+        sys.exit(0)
+    ...
+    instance.listen()
+    instance.message_received.connect(main_window.bring_to_front)
+
+QtNetwork is not used, it is excluded from the build.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from PySide6.QtCore import QDir, QLockFile, QObject, Signal
+
+import app.builtin.config as cfg
+
+
+def default_server_name() -> str:
+    # Socket names are global on some platforms, keep them per user
+    user = hashlib.sha1(QDir.homePath().encode()).hexdigest()[:8]
+    return f"{cfg.ORG_NAME}-{cfg.APP_NAME}-{user}".replace(" ", "_")
+
+
+class SingleInstance(QObject):
+    # Arguments of a later launch, emitted on the thread of this object
+    message_received = Signal(list)
+
+    # Seconds a later launch waits for the first one to answer
+    connect_timeout = 2.0
+
+    def __init__(self, name: str | None = None, parent: QObject | None = None):
+        super().__init__(parent)
+        self.name = name or default_server_name()
+        self._lock = QLockFile(f"{QDir.tempPath()}/{self.name}.lock")
+        self._listener: Listener | None = None
+
+    @property
+    def address(self) -> str:
+        if sys.platform == "win32":
+            return rf"\\.\pipe\{self.name}"
+        return f"{QDir.tempPath()}/{self.name}.sock"
+
+    def acquire(self, timeout: float = 0) -> bool:
+        """
+        Return True in the first instance, the lock is held until `release()`.
+        Wait up to `timeout` seconds for another instance to release it.
+        """
+        return self._lock.tryLock(int(timeout * 1000))
+
+    def listen(self) -> bool:
+        """Accept arguments from later launches on a daemon thread."""
+        if sys.platform != "win32":
+            # A socket left behind by a crashed instance, the lock is ours
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+        try:
+            listener = Listener(self.address)
+        except OSError:
+            return False
+        if sys.platform != "win32":
+            os.chmod(self.address, 0o600)
+        self._listener = listener
+        threading.Thread(
+            target=self._serve, args=(listener,), name="single-instance", daemon=True
+        ).start()
+        return True
+
+    def forward(self, args: list[str]) -> bool:
+        """Send `args` to the first instance, return False if it did not answer."""
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                connection = Client(self.address)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    return False
+                # The first instance may hold the lock but not listen yet
+                time.sleep(0.05)
+        with connection:
+            try:
+                connection.send_bytes(json.dumps(args).encode())
+            except OSError:
+                return False
+        return True
+
+    def release(self):
+        listener = self._listener
+        if listener is not None:
+            self._listener = None
+            # Wake up the blocking accept, the thread sees the listener is gone
+            try:
+                Client(self.address).close()
+            except OSError:
+                pass
+            listener.close()
+        self._lock.unlock()
+
+    def _serve(self, listener: Listener):
+        while self._listener is listener:
+            try:
+                connection = listener.accept()
+            except OSError:
+                return
+            with connection:
+                try:
+                    args = json.loads(connection.recv_bytes(64 * 1024))
+                except (OSError, EOFError, ValueError):
+                    continue
+            if isinstance(args, list):
+                self.message_received.emit([str(arg) for arg in args])
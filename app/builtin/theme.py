@@ -0,0 +1,215 @@
+"""
+Cached qdarktheme themes.
+
+`qdarktheme.setup_theme` renders the stylesheet template and builds the
+palette on every call. `ThemeManager` builds each theme once, keeps it in
+memory and in `AppPaths.base_dir/theme_cache`, keyed by the qdarktheme
+version and the device pixel ratio, and only applies it when the theme
+really changes. "auto" follows the OS color scheme through
+`QStyleHints.colorSchemeChanged`, switching applies the cached theme.
+
+The stylesheet refers to icons that qdarktheme writes per color, a cached
+theme is only used while all of them exist. Without the private qdarktheme
+API the cache relies on, themes are applied with `qdarktheme.setup_theme`.
+
+    ThemeManager().setup_theme("auto")
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+import qdarktheme
+from PySide6.QtCore import QObject, Qt, Signal
+from PySide6.QtGui import QColor, QGuiApplication, QPalette
+from singleton_decorator import singleton
+
+from app.builtin.paths import AppPaths
+from app.builtin.trace import span
+
+THEMES = ("auto", "dark", "light")
+
+_COLOR_GROUPS = (
+    QPalette.ColorGroup.Active,
+    QPalette.ColorGroup.Inactive,
+    QPalette.ColorGroup.Disabled,
+)
+_COLOR_ROLES = [role for role in QPalette.ColorRole if role != QPalette.ColorRole.NColorRoles]
+_URL_RE = re.compile(r"url\(([^)]+)\)")
+
+
+class CompiledTheme:
+    def __init__(self, stylesheet: str, palette: QPalette):
+        self.stylesheet = stylesheet
+        self.palette = palette
+
+    @property
+    def icon_files(self) -> list[str]:
+        """Icon files the stylesheet refers to."""
+        return sorted(set(_URL_RE.findall(self.stylesheet)))
+
+
+def _palette_to_dict(palette: QPalette) -> dict[str, dict[str, str]]:
+    # Only the colors the theme sets, the others come from the style
+    return {
+        group.name: {
+            role.name: palette.color(group, role).name(QColor.NameFormat.HexArgb)
+            for role in _COLOR_ROLES
+            if palette.isBrushSet(group, role)
+        }
+        for group in _COLOR_GROUPS
+    }
+
+
+def _palette_from_dict(data: dict[str, dict[str, str]]) -> QPalette:
+    palette = QPalette()
+    for group in _COLOR_GROUPS:
+        for role, color in data[group.name].items():
+            palette.setColor(group, QPalette.ColorRole[role], QColor(color))
+    return palette
+
+
+def _install_proxy_style() -> bool:
+    """
+    Like `qdarktheme.setup_theme`, the proxy style draws the standard icons.
+    Return False if the private qdarktheme module is missing.
+    """
+    app = QGuiApplication.instance()
+    if app.property("_qdarktheme_use_setup_style"):
+        return True
+    try:
+        from qdarktheme._proxy_style import QDarkThemeStyle
+    except ImportError:
+        return False
+
+    app.setProperty("_qdarktheme_use_setup_style", True)
+    app.setStyle(QDarkThemeStyle())
+    return True
+
+
+@singleton
+class ThemeManager(QObject):
+    # "dark" or "light", also when "auto" follows the OS
+    theme_changed = Signal(str)
+
+    def __init__(self, cache_dir: str | Path | None = None, corner_shape: str = "rounded"):
+        super().__init__()
+        if cache_dir is None:
+            cache_dir = AppPaths().base_dir / "theme_cache"
+        self.cache_dir = Path(cache_dir) / qdarktheme.__version__
+        self.corner_shape = corner_shape
+        # "auto", "dark" or "light", as requested
+        self.theme: str | None = None
+        # "dark" or "light", as applied
+        self.applied: str | None = None
+        self._compiled: dict[tuple[str, float], CompiledTheme] = {}
+        self._following = False
+
+    def setup_theme(self, theme: str):
+        if theme not in THEMES:
+            raise ValueError(f"Unknown theme: {theme}")
+        self.theme = theme
+        self._follow_system(theme == "auto")
+        self._apply(self.resolve(theme))
+
+    def resolve(self, theme: str) -> str:
+        """Map "auto" to the OS color scheme, "dark" if it is unknown."""
+        if theme != "auto":
+            return theme
+        scheme = QGuiApplication.styleHints().colorScheme()
+        if scheme == Qt.ColorScheme.Light:
+            return "light"
+        return "dark"
+
+    def compiled(self, theme: str) -> CompiledTheme:
+        """Build the stylesheet and the palette of "dark" or "light", or load them from the cache."""
+        key = (theme, self._device_pixel_ratio())
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self._load(*key)
+            if compiled is None:
+                compiled = self._build(theme)
+                self._save(*key, compiled)
+            self._compiled[key] = compiled
+        return compiled
+
+    def _apply(self, theme: str):
+        if theme == self.applied:
+            return
+        app = QGuiApplication.instance()
+        if not _install_proxy_style():
+            # Another qdarktheme version, build the theme every time
+            with span("ThemeManager.apply", theme=theme):
+                qdarktheme.setup_theme(theme, self.corner_shape)
+        else:
+            compiled = self.compiled(theme)
+            with span("ThemeManager.apply", theme=theme):
+                app.setStyleSheet(compiled.stylesheet)
+                app.setPalette(compiled.palette)
+        self.applied = theme
+        self.theme_changed.emit(theme)
+
+    def _follow_system(self, follow: bool):
+        if follow == self._following:
+            return
+        hints = QGuiApplication.styleHints()
+        if follow:
+            hints.colorSchemeChanged.connect(self._on_color_scheme_changed)
+        else:
+            hints.colorSchemeChanged.disconnect(self._on_color_scheme_changed)
+        self._following = follow
+
+    def _on_color_scheme_changed(self):
+        self._apply(self.resolve("auto"))
+
+    @staticmethod
+    def _device_pixel_ratio() -> float:
+        screen = QGuiApplication.primaryScreen()
+        return screen.devicePixelRatio() if screen is not None else 1.0
+
+    def _cache_file(self, theme: str, ratio: float) -> Path:
+        return self.cache_dir / f"{theme}-{self.corner_shape}-{ratio:g}.json"
+
+    def _build(self, theme: str) -> CompiledTheme:
+        from qdarktheme import load_palette, load_stylesheet
+
+        with span("ThemeManager.build", theme=theme):
+            # The stylesheet differs without the proxy style
+            _install_proxy_style()
+            stylesheet = load_stylesheet(theme, self.corner_shape)
+            palette = load_palette(theme, for_stylesheet=True)
+        return CompiledTheme(stylesheet, palette)
+
+    def _load(self, theme: str, ratio: float) -> CompiledTheme | None:
+        try:
+            with open(self._cache_file(theme, ratio), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            compiled = CompiledTheme(data["stylesheet"], _palette_from_dict(data["palette"]))
+            icon_files = data["icons"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        # qdarktheme writes the icons to its own cache when it builds a theme,
+        # e.g. cleaned up or never built for these colors
+        if not all(map(os.path.isfile, icon_files)):
+            return None
+        return compiled
+
+    def _save(self, theme: str, ratio: float, compiled: CompiledTheme):
+        file = self._cache_file(theme, ratio)
+        try:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = file.with_name(file.name + ".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "stylesheet": compiled.stylesheet,
+                        "palette": _palette_to_dict(compiled.palette),
+                        "icons": compiled.icon_files,
+                    },
+                    f,
+                )
+            os.replace(tmp_file, file)
+        except OSError:
+            # The memory cache still works
+            pass
@@ -0,0 +1,137 @@
+"""
+Lightweight span tracing for startup phases and async slots.
+
+Enabled with `APP_TRACE=1`, spans are written as Chrome trace-event JSON
+to `AppPaths.base_dir/trace.json` by `dump()`. Open it in `chrome://tracing`
+or https://ui.perfetto.dev. Without the flag every call is a no-op.
+
+Every span records the enclosing span of the same thread or task as its
+`parent` argument, async slots that interleave on the event loop thread
+can not be told apart by their timestamps alone.
+
+    with span("create main window"):
+        main_window = MainWindow()
+
+    @span("check update")
+    async def check_update(self):
+        ...
+"""
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+ENV_FLAG = "APP_TRACE"
+
+enabled = os.getenv(ENV_FLAG, "0") == "1"
+
+_events: list[dict] = []
+_lock = threading.Lock()
+_pid = os.getpid()
+# Timestamps are relative to the import of this module
+_origin_ns = time.perf_counter_ns()
+# Name of the innermost open span, tasks and threads have their own
+_current: ContextVar[str | None] = ContextVar("trace_span", default=None)
+
+
+def _now_us() -> float:
+    return (time.perf_counter_ns() - _origin_ns) / 1000
+
+
+def _add_event(name: str, start_us: float, args: dict):
+    event = {
+        "name": name,
+        "ph": "X",
+        "ts": start_us,
+        "dur": _now_us() - start_us,
+        "pid": _pid,
+        "tid": threading.get_ident(),
+    }
+    if args:
+        event["args"] = args
+    with _lock:
+        _events.append(event)
+
+
+class span:
+    """Record the duration of a block, or of every call when used as a decorator."""
+
+    def __init__(self, name: str, **args):
+        self.name = name
+        self.args = args
+        self._start_us = 0.0
+        self._parent: str | None = None
+        self._token = None
+
+    def __enter__(self):
+        if enabled:
+            self._parent = _current.get()
+            self._token = _current.set(self.name)
+            self._start_us = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+            args = self.args
+            if self._parent is not None:
+                args = {**args, "parent": self._parent}
+            _add_event(self.name, self._start_us, args)
+        return False
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(self.name, **self.args):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(self.name, **self.args):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def instant(name: str, **args):
+    """Record a point in time, e.g. the first paint."""
+    if not enabled:
+        return
+    event = {
+        "name": name,
+        "ph": "i",
+        "s": "p",
+        "ts": _now_us(),
+        "pid": _pid,
+        "tid": threading.get_ident(),
+    }
+    if args:
+        event["args"] = args
+    with _lock:
+        _events.append(event)
+
+
+def dump(file: str | Path | None = None) -> Path | None:
+    """Write the recorded events, default to `AppPaths.base_dir/trace.json`."""
+    if not enabled:
+        return None
+    if file is None:
+        from app.builtin.paths import AppPaths
+
+        file = AppPaths().base_dir / "trace.json"
+    file = Path(file)
+    with _lock:
+        events = list(_events)
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return file
@@ -1,22 +1,35 @@
+from __future__ import annotations
+
 import enum
+import functools
+import importlib.util
 import json
 import os
 import platform
+import re
 import shutil
 import subprocess
 import sys
 from abc import abstractmethod, ABC
 from pathlib import Path
-from packaging.version import Version as BuiltinVersion
-
-from httpx import AsyncClient
-import psutil
+from typing import TYPE_CHECKING, Iterable
 
 from app.resources.version import __version__
 from app.builtin.args import pop_arg, pop_arg_pair
 from app.builtin.paths import AppPaths
 import app.builtin.config as cfg
 
+# httpx and the install helpers are imported on first use,
+# so constructing an updater stays cheap at startup
+if TYPE_CHECKING:
+    from httpx import AsyncClient, Response
+
+    from app.builtin.http_cache import MetadataCache
+
+
+# HTTP/2 needs the optional `h2` package, e.g. `httpx[http2]`
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
 
 def get_sysname() -> str:
     sysname = platform.system().lower()
@@ -42,6 +55,25 @@ def get_arch() -> str:
     return arch
 
 
+def is_onedir_build() -> bool:
+    """
+    Return True if this is a onedir build running from its install directory,
+    the layout `Updater.copy_self_and_exit()` installs over the working directory.
+    False for macOS bundles, onefile builds and runs from source.
+    """
+    if sys.platform == "darwin":
+        return False
+    if not getattr(sys, "frozen", False) and "__compiled__" not in globals():
+        return False
+    exe_dir = Path(sys.executable).resolve().parent
+    # Nuitka onefile builds run from a temporary directory
+    if exe_dir != Path(os.getcwd()).resolve():
+        return False
+    # PyInstaller onefile builds unpack their files into a temporary directory
+    bundle_dir = getattr(sys, "_MEIPASS", None)
+    return bundle_dir is None or Path(bundle_dir).resolve().is_relative_to(exe_dir)
+
+
 class ReleaseType(enum.Enum):
     STABLE = "stable"
     BETA = "beta"
@@ -50,32 +82,153 @@ class ReleaseType(enum.Enum):
     NIGHTLY = "nightly"
 
 
-class Version(BuiltinVersion):
-    def __init__(self, version_string: str):
-        version_part = version_string.split("-")
-        super().__init__(version_part[0])
-        if len(version_part) == 1:
-            self.release_type = ReleaseType.STABLE
-            return
-        if version_part[1] == "stable":
-            self.release_type = ReleaseType.STABLE
-        elif version_part[1] == "beta":
-            self.release_type = ReleaseType.BETA
-        elif version_part[1] == "alpha":
-            self.release_type = ReleaseType.ALPHA
-        elif version_part[1] == "dev":
-            self.release_type = ReleaseType.DEV
-        elif version_part[1] == "nightly":
-            self.release_type = ReleaseType.NIGHTLY
-        else:
-            raise RuntimeError(f"Unknown release type: {version_part[1]}")
+# Suffix of a tag -> release type, a tag without suffix is stable
+RELEASE_TYPES = {release_type.value: release_type for release_type in ReleaseType}
+
+# Sort key parts for versions without pre-, post- or dev-release,
+# ordered like `packaging.version.Version`
+_FINAL_PRE = (1,)
+_NO_POST = (-1,)
+_NO_DEV = (1,)
+
+
+class Version:
+    """
+    Version of a release tag like `1.2.3` or `1.2.3-beta`.
+
+    Instances are immutable and interned, constructing the same tag twice
+    returns the same object. Comparison uses a precomputed sort key and
+    ignores the release type, like the numeric version of the tag.
+    """
+
+    __slots__ = ("_number", "_key", "release_type")
+
+    _number: str
+    _key: tuple
+    release_type: ReleaseType
+
+    def __new__(cls, version_string: str):
+        return _parse_version(version_string)
+
+    def __reduce__(self):
+        return Version, (str(self),)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
     def __str__(self):
-        return f"{super().__str__()}-{self.release_type.value}"
+        return f"{self._number}-{self.release_type.value}"
+
+    def __repr__(self):
+        return f"<Version('{self}')>"
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __eq__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key == other._key
+
+    def __ne__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key != other._key
+
+    def __lt__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key < other._key
+
+    def __le__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key <= other._key
+
+    def __gt__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key > other._key
+
+    def __ge__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key >= other._key
 
     def get_number_version(self):
-        """Get the version as a tuple of integers."""
-        return super().__str__()
+        """Get the version without the release type, e.g. `1.2.3`."""
+        return self._number
+
+
+# Plain tags like `1.2.3` without leading zeros skip `packaging`
+_PLAIN_VERSION_RE = re.compile(r"(?:0|[1-9]\d*)(?:\.(?:0|[1-9]\d*))*")
+# Slot setters, `Version.__setattr__` refuses assignments
+_set_number = Version._number.__set__
+_set_key = Version._key.__set__
+_set_release_type = Version.release_type.__set__
+
+
+@functools.lru_cache(maxsize=16384)
+def _parse_version(version_string: str) -> Version:
+    number, dash, suffix = version_string.partition("-")
+    if not dash:
+        release_type = ReleaseType.STABLE
+    else:
+        suffix = suffix.split("-")[0]
+        release_type = RELEASE_TYPES.get(suffix)
+        if release_type is None:
+            raise RuntimeError(f"Unknown release type: {suffix}")
+
+    if _PLAIN_VERSION_RE.fullmatch(number):
+        release = tuple(map(int, number.split(".")))
+        key = (0, release, _FINAL_PRE, _NO_POST, _NO_DEV)
+    else:
+        # PEP 440 versions like `1.2.0rc1`
+        from packaging.version import Version as BuiltinVersion
+
+        parsed = BuiltinVersion(number)
+        number = str(parsed)
+        release = parsed.release
+        if parsed.pre is None and parsed.post is None and parsed.dev is not None:
+            # `1.0.dev0` sorts before `1.0a0`
+            pre = (-1,)
+        elif parsed.pre is None:
+            pre = _FINAL_PRE
+        else:
+            pre = (0, *parsed.pre)
+        post = _NO_POST if parsed.post is None else (parsed.post,)
+        dev = _NO_DEV if parsed.dev is None else (0, parsed.dev)
+        key = (parsed.epoch, release, pre, post, dev)
+
+    if release[-1] == 0 and len(release) > 1:
+        # Trailing zeros do not count, `1.2` == `1.2.0`
+        while len(release) > 1 and release[-1] == 0:
+            release = release[:-1]
+        key = (key[0], release, *key[2:])
+
+    version = object.__new__(Version)
+    _set_number(version, number)
+    _set_key(version, key)
+    _set_release_type(version, release_type)
+    return version
+
+
+def newest_in_channel(
+    tags: Iterable[str], release_type: ReleaseType
+) -> tuple[int, Version] | None:
+    """Get the index and version of the newest tag of `release_type`, or None."""
+    best_index = -1
+    best_version = None
+    for index, tag in enumerate(tags):
+        version = Version(tag)
+        if version.release_type is not release_type:
+            continue
+        if best_version is None or version._key > best_version._key:
+            best_index = index
+            best_version = version
+    if best_version is None:
+        return None
+    return best_index, best_version
 
 
 class Updater(ABC):
@@ -88,16 +241,36 @@ class Updater(ABC):
     current_version: Version
 
     def __init__(self):
-        # Three attributes can be set by updater.json
+        # See `load_from_file_and_override()` and `load_rollout_from_file()`
+        # for the attributes set by updater.json and rollout.json
         self.current_version = Updater._load_current_version()
         self.release_type = self.current_version.release_type
         self.proxy = None
+        self.download_connections = 4
+        # seconds to trust cached release metadata without revalidating it
+        self.metadata_ttl = 0
+        # seconds between two background checks, see `UpdateScheduler`
+        self.check_interval = 6 * 60 * 60
+        # bytes per second for package downloads, 0 is unlimited
+        self.bandwidth_limit = 0
+        # percent of installs that are offered a new release, see `app.builtin.rollout`
+        self.rollout_percentage = 100.0
+        self._install_id = None
+        self._metadata_cache = None
+        self._client = None
 
         # must set in self.fetch()
         self.remote_version = None
         self.description = ""
         self.download_url = ""
         self.filename = ""
+        self.content_length = 0
+        self.accept_ranges = False
+        # optional, set in self.fetch() if the release has a delta package
+        self.delta_url = None
+        self.delta_filename = ""
+        # optional, set in self.fetch() if the package has a `.sha256` file
+        self.checksum_url = None
 
         # cmd line args
         self.is_updated = False
@@ -107,6 +280,9 @@ class Updater(ABC):
         if pop_arg(Updater._updated_cmd, False):
             self.is_updated = True
             Updater.clean_old_package()
+        elif Updater._old_pid_cmd in sys.argv:
+            # Restarted after a failed installation, only waited for the lock
+            pop_arg_pair(Updater._old_pid_cmd)
         if pop_arg(Updater._disable_cmd, False):
             self.is_enable = False
 
@@ -120,15 +296,84 @@ class Updater(ABC):
             self.current_version = Version(version)
         self.proxy = data.get("proxy", None)
         self.release_type = ReleaseType(data.get("channel", "stable"))
+        self.download_connections = int(data.get("connections", 4))
+        self.metadata_ttl = float(data.get("metadata_ttl", 0))
+        self.check_interval = float(data.get("check_interval", 6 * 60 * 60))
+        self._load_rollout(data)
+
+    def load_rollout_from_file(self, file: str | Path):
+        """
+        Load the rollout policy (`rollout`, `bandwidth_limit`) from a JSON file,
+        e.g. `rollout.json` deployed by administrators to a fleet.
+        """
+        with open(file, "r", encoding="utf-8") as f:
+            self._load_rollout(json.load(f))
+
+    def _load_rollout(self, data: dict):
+        self.rollout_percentage = float(data.get("rollout", self.rollout_percentage))
+        self.bandwidth_limit = int(data.get("bandwidth_limit", self.bandwidth_limit))
+
+    @property
+    def install_id(self) -> str:
+        if self._install_id is None:
+            from app.builtin.rollout import load_install_id
+
+            self._install_id = load_install_id(AppPaths().base_dir)
+        return self._install_id
+
+    def in_rollout(self) -> bool:
+        """Return True if the fetched release is rolled out to this install."""
+        from app.builtin.rollout import in_rollout
+
+        return in_rollout(
+            self.install_id, str(self.remote_version), self.rollout_percentage
+        )
 
     @abstractmethod
     def create_async_client(self) -> AsyncClient:
         pass
 
+    @property
+    def client(self) -> AsyncClient:
+        """
+        Long-lived pooled client shared by metadata fetch, HEAD and download,
+        so a whole check-and-download costs one connection setup.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self.create_async_client()
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
     @abstractmethod
     async def fetch(self):
         pass
 
+    @property
+    def metadata_cache(self) -> MetadataCache:
+        """Conditional-request cache for release metadata, see `MetadataCache`."""
+        if self._metadata_cache is None:
+            from app.builtin.http_cache import MetadataCache
+
+            paths = AppPaths()
+            self._metadata_cache = MetadataCache(paths.base_dir / "http_cache.json")
+        self._metadata_cache.ttl = self.metadata_ttl
+        return self._metadata_cache
+
+    def _delta_asset_prefix(self, package_name: str) -> str:
+        """Delta assets are named `{package_name}-delta-{from_version}.zip`"""
+        return f"{package_name}-delta-{self.current_version.get_number_version()}."
+
+    def _read_head_response(self, response: Response):
+        """Remember the package size and range support from a HEAD response."""
+        self.content_length = int(response.headers.get("content-length", 0))
+        self.accept_ranges = (
+            response.headers.get("accept-ranges", "").lower() == "bytes"
+        )
+
     @staticmethod
     def _load_current_version():
         """Get version from app"""
@@ -141,6 +386,11 @@ class Updater(ABC):
             and self.remote_version > self.current_version
         )
 
+    @staticmethod
+    def onedir_package_dir() -> Path:
+        """Directory of an extracted onedir package, run by `apply_update()`."""
+        return AppPaths().update_dir / cfg.APP_NAME
+
     @staticmethod
     def apply_update():
         """
@@ -167,7 +417,7 @@ class Updater(ABC):
                 cwd=paths.update_dir,
             )
         elif sys.platform == "linux":
-            new_executable_name = Path(f"{paths.update_dir}/{cfg.APP_NAME}")
+            new_executable_name = Updater.onedir_package_dir()
             work_dir = Path(f"{paths.update_dir}")
             if new_executable_name.is_dir():
                 # Onedir
@@ -187,7 +437,7 @@ class Updater(ABC):
                 cwd=work_dir,
             )
         else:  # win32
-            new_executable_name = Path(f"{paths.update_dir}/{cfg.APP_NAME}")
+            new_executable_name = Updater.onedir_package_dir()
             new_executable_name_with_exe = Path(
                 f"{paths.update_dir}/{cfg.APP_NAME}.exe"
             )
@@ -215,62 +465,64 @@ class Updater(ABC):
 
         sys.exit(0)
 
+    @staticmethod
+    def _wait_for_process(pid: int):
+        import psutil
+
+        try:
+            old_process = psutil.Process(pid)
+            old_process.wait()
+        except psutil.NoSuchProcess:
+            pass
+
     @staticmethod
     def copy_self_and_exit():
         """Copy current executable to raw directory and run it with --updated argument."""
         # Wait for the old executable to exit
+        from app.builtin.install import InstallError, TreeInstaller
+        from app.builtin.manifest import MANIFEST_NAME
+
         old_pid = int(pop_arg_pair(Updater._old_pid_cmd))
         old_dir = pop_arg_pair(Updater._old_dir_cmd)
-        try:
-            old_process = psutil.Process(old_pid)
-            old_process.wait()
-        except psutil.NoSuchProcess:
-            pass
+        Updater._wait_for_process(old_pid)
 
         parent_dir = Path(old_dir)
         current_dir = Path(os.getcwd())
         filelist = parent_dir / "filelist.txt"
         # delete files by ../filelist.txt if it exists, workdir is parent directory
+        remove = []
         if filelist.exists():
             with open(filelist, "r", encoding="utf-8") as f:
-                for line in f:
-                    path = line.strip()
-                    if not path:
-                        continue
-                    abs_path = parent_dir / path
-                    try:
-                        if abs_path.is_file():
-                            abs_path.unlink()
-                        elif abs_path.is_dir():
-                            shutil.rmtree(abs_path)
-                    except Exception:
-                        continue
-
-        # Copy current directory to parent directory
+                remove = [line.strip() for line in f if line.strip()]
+
+        # Move current directory to parent directory, roll back on failure
+        installed = True
         if sys.platform == "darwin":
+            for path in remove:
+                abs_path = parent_dir / path
+                if abs_path.is_file():
+                    abs_path.unlink()
+                elif abs_path.is_dir():
+                    shutil.rmtree(abs_path, ignore_errors=True)
             old_bundle = f"{parent_dir}/{cfg.APP_NAME}.app"
             new_bundle = f"{os.getcwd()}/{cfg.APP_NAME}.app"
             shutil.rmtree(old_bundle)
             subprocess.run(f"ditto {new_bundle} {old_bundle}", check=True)
         else:
-            for item in current_dir.iterdir():
-                target = parent_dir / item.name
-                try:
-                    if item.is_file():
-                        shutil.copy2(item, target)
-                    elif item.is_dir():
-                        if target.exists():
-                            shutil.rmtree(target)
-                        shutil.copytree(item, target)
-                except Exception:
-                    continue
-
-        # Run copied executable with --updated argument
-        options = [
-            Updater._updated_cmd,
-            Updater._old_pid_cmd,
-            str(os.getpid()),
-        ]
+            installer = TreeInstaller(current_dir, parent_dir)
+            try:
+                if (current_dir / MANIFEST_NAME).is_file():
+                    installer.install_changed(remove)
+                else:
+                    installer.install(remove)
+            except InstallError:
+                installed = False
+
+        # Run copied executable with --updated argument,
+        # or the restored old executable if the installation failed
+        options = [Updater._old_pid_cmd, str(os.getpid())]
+        if installed:
+            options.insert(0, Updater._updated_cmd)
         if sys.platform == "win32":
             new_executable = f"{parent_dir}/{cfg.APP_NAME}.exe"
             subprocess.Popen(
@@ -300,11 +552,7 @@ class Updater(ABC):
         """Delete Package directory"""
         # Wait for the old executable to exit
         old_pid = int(pop_arg_pair(Updater._old_pid_cmd))
-        try:
-            old_process = psutil.Process(old_pid)
-            old_process.wait()
-        except psutil.NoSuchProcess:
-            pass
+        Updater._wait_for_process(old_pid)
 
         # Remove files in package_dir
         paths = AppPaths()
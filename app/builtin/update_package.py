@@ -0,0 +1,175 @@
+import asyncio
+import enum
+import os
+import zipfile
+from contextlib import suppress
+from pathlib import Path
+from typing import Callable
+
+from httpx import HTTPError
+
+from app.builtin.asyncio import run_in_executor, threadsafe_callback
+from app.builtin.checksum import Checksum, parse_checksum
+from app.builtin.delta import DeltaError, apply_delta
+from app.builtin.download import RangedDownloader
+from app.builtin.extract import (
+    StreamPipe,
+    extract_archive,
+    extract_tar_stream,
+    is_tar_archive,
+)
+from app.builtin.update import Updater, is_onedir_build
+
+
+class PackageStage(enum.Enum):
+    DOWNLOAD = "download"
+    EXTRACT = "extract"
+    APPLY_DELTA = "apply_delta"
+
+
+class UpdatePackage:
+    """
+    Download and extract the package found by `Updater.fetch()` into the
+    update directory, so `Updater.apply_update()` can be called afterward.
+
+    Prefers the delta package, `.tar.gz` packages are extracted while they
+    download, zip packages are downloaded first and extracted in parallel.
+    Callbacks are called on the event loop thread.
+
+    If the release publishes a checksum of the package, the download is
+    verified while it streams and corrupt blocks are downloaded again.
+    """
+
+    def __init__(
+        self,
+        updater: Updater,
+        on_stage: Callable[[PackageStage], None] | None = None,
+        on_progress: Callable[[int, int], None] | None = None,
+    ):
+        self.updater = updater
+        self._on_stage = on_stage
+        self._on_progress = on_progress
+
+    def _stage(self, stage: PackageStage):
+        if self._on_stage is not None:
+            self._on_stage(stage)
+
+    def _progress(self, done: int, total: int):
+        if self._on_progress is not None:
+            self._on_progress(done, total)
+
+    async def prepare(self):
+        self._stage(PackageStage.DOWNLOAD)
+        if await self.update_from_delta():
+            return
+        if self.can_stream_extract():
+            await self.download_and_extract()
+        else:
+            await self.download()
+            self._stage(PackageStage.EXTRACT)
+            await run_in_executor(
+                "cpu", self.extract, threadsafe_callback(self._progress)
+            )
+
+    async def update_from_delta(self) -> bool:
+        """
+        Rebuild the new version from the installed directory and the delta package.
+        Return False if there is no delta package or it can not be applied,
+        the full package should be used instead.
+        Deltas are built between onedir trees, other builds skip the download.
+        """
+        if not self.updater.delta_url or not is_onedir_build():
+            return False
+        try:
+            downloader = RangedDownloader(
+                self.updater.client,
+                self.updater.delta_url,
+                self.updater.delta_filename,
+                bandwidth=self.updater.bandwidth_limit,
+            )
+            await downloader.run(self._progress)
+            self._stage(PackageStage.APPLY_DELTA)
+            target_dir = self.updater.onedir_package_dir()
+            await run_in_executor(
+                "cpu",
+                apply_delta,
+                self.updater.delta_filename,
+                os.getcwd(),
+                target_dir,
+            )
+            return True
+        except (HTTPError, DeltaError, OSError, zipfile.BadZipFile):
+            self._stage(PackageStage.DOWNLOAD)
+            return False
+
+    async def load_checksum(self) -> Checksum | None:
+        if not self.updater.checksum_url:
+            return None
+        r = await self.updater.client.get(self.updater.checksum_url)
+        r.raise_for_status()
+        return parse_checksum(r.text)
+
+    async def create_downloader(self) -> RangedDownloader:
+        return RangedDownloader(
+            self.updater.client,
+            self.updater.download_url,
+            self.updater.filename,
+            total_size=self.updater.content_length,
+            accept_ranges=self.updater.accept_ranges,
+            connections=self.updater.download_connections,
+            checksum=await self.load_checksum(),
+            bandwidth=self.updater.bandwidth_limit,
+        )
+
+    async def download(self):
+        downloader = await self.create_downloader()
+        await downloader.run(self._progress)
+
+    def can_stream_extract(self) -> bool:
+        """
+        `.tar.gz` packages can be extracted while downloading,
+        zip needs the central directory at the end of the file.
+        A partial download is resumed with the two-phase path instead.
+        """
+        journal_file = Path(f"{self.updater.filename}.journal")
+        return is_tar_archive(self.updater.filename) and not journal_file.exists()
+
+    async def download_and_extract(self):
+        pipe = StreamPipe()
+        dest = os.path.dirname(self.updater.filename)
+        # The io pool, the extraction blocks on the pipe while waiting for data
+        extract_task = asyncio.ensure_future(
+            run_in_executor("io", extract_tar_stream, pipe, dest)
+        )
+
+        async def sink(chunk: bytes):
+            # The extraction stops at a corrupt block, the download goes on,
+            # so the block is fetched again and the file extracted below
+            with suppress(BrokenPipeError):
+                await pipe.write_async(chunk)
+
+        try:
+            downloader = await self.create_downloader()
+            await downloader.run(self._progress, sink=sink)
+        except BaseException:
+            pipe.abort()
+            with suppress(Exception):
+                await extract_task
+            raise
+        pipe.close()
+        self._stage(PackageStage.EXTRACT)
+        if not downloader.repaired:
+            await extract_task
+            return
+        # The stream fed the corrupt blocks to the extraction,
+        # extract again from the repaired file
+        with suppress(Exception):
+            await extract_task
+        await run_in_executor("cpu", self.extract, threadsafe_callback(self._progress))
+
+    def extract(self, on_progress=None):
+        extract_archive(
+            self.updater.filename,
+            os.path.dirname(self.updater.filename),
+            on_progress=on_progress,
+        )
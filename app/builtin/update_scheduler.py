@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import random
+
+from PySide6.QtCore import QObject, Signal
+from httpx import HTTPError
+
+from app.builtin.trace import span
+from app.builtin.update import Updater, Version
+from app.builtin.update_package import UpdatePackage
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateScheduler(QObject):
+    """
+    Check for updates in the background on the qasync loop.
+
+    Every check runs `Updater.fetch()` after `Updater.check_interval` seconds
+    with random jitter, failed requests are retried with exponential backoff.
+    A new version is downloaded and extracted in the background once it is
+    rolled out to this install (`Updater.in_rollout()`), `update_available`
+    is emitted before the download and `update_ready` once the package can
+    be applied. A version that is already prepared is not downloaded again,
+    the next check only emits `update_ready` to ask the user again.
+
+    Network and HTTP errors are expected while offline and only logged,
+    any other error is logged and reported with `check_failed`, the next
+    check runs after the regular interval.
+    """
+
+    update_available = Signal()
+    update_ready = Signal()
+    check_failed = Signal(Exception)
+
+    # Fraction of the interval added or subtracted at random
+    jitter = 0.1
+    backoff_base = 60
+    backoff_max = 6 * 60 * 60
+
+    def __init__(self, updater: Updater, parent: QObject | None = None):
+        super().__init__(parent)
+        self.updater = updater
+        self._task: asyncio.Future | None = None
+        # Version extracted in the update directory by the last check
+        self.prepared_version: Version | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, delay: float | None = None):
+        """Start checking, the first check runs after `delay` seconds (jittered interval by default)."""
+        if self.running:
+            return
+        if delay is None:
+            delay = self.next_delay()
+        self._task = asyncio.ensure_future(self._run(delay))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def next_delay(self) -> float:
+        interval = self.updater.check_interval
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def backoff_delay(self, failures: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (failures - 1))
+        # Full jitter, so clients that failed together do not retry together
+        return random.uniform(delay / 2, delay)
+
+    @span("UpdateScheduler.check")
+    async def check(self) -> bool:
+        """Return True if a new version was found and prepared."""
+        await self.updater.fetch()
+        if not self.updater.check_for_update():
+            return False
+        if not self.updater.in_rollout():
+            # Not this install's turn yet, the next check asks again
+            return False
+        if self.updater.remote_version == self.prepared_version:
+            return True
+        self.update_available.emit()
+        self.prepared_version = None
+        await UpdatePackage(self.updater).prepare()
+        self.prepared_version = self.updater.remote_version
+        return True
+
+    async def _run(self, delay: float):
+        failures = 0
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                if await self.check():
+                    self.update_ready.emit()
+                    return
+                failures = 0
+                delay = self.next_delay()
+            except HTTPError as e:
+                failures += 1
+                delay = self.backoff_delay(failures)
+                logger.info("Update check failed, retry in %.0f s: %r", delay, e)
+            except Exception as e:
+                # e.g. no package for this platform, try again next interval
+                logger.exception("Update check failed")
+                failures = 0
+                delay = self.next_delay()
+                self.check_failed.emit(e)
@@ -1,26 +1,29 @@
-import os
-
 from PySide6.QtCore import Qt
 from qasync import asyncSlot
 
 from app.builtin.async_widget import AsyncWidget
-from app.builtin.asyncio import to_thread
+from app.builtin.progress import Progress, ProgressReporter, format_eta, format_size
+from app.builtin.trace import span
 from app.builtin.update import Updater
+from app.builtin.update_package import PackageStage, UpdatePackage
 from app.resources.builtin.update_widget_ui import Ui_UpdateWidget
 
 
-class UpdateWidget(AsyncWidget):
+class UpdateWidget(AsyncWidget[bool]):
     """
     If the update resource is downloaded and extracted successfully,
-    the application can call `Updater.apply_update()` and close itself
-    to restart with the new version.
+    `async_show()` returns True, the application can call
+    `Updater.apply_update()` and close itself to restart with the new version.
+    Pass `ready=True` if the package was already prepared in the background,
+    e.g. by `UpdateScheduler`.
+
+    The widget can be pooled, `reset()` shows the current release of the updater.
     """
     need_restart: bool
 
-    def __init__(self, parent, updater: Updater):
+    def __init__(self, parent, updater: Updater, ready: bool = False):
         super().__init__(parent)
         self.updater = updater
-        self.need_restart = False
         flags = self.windowFlags()
         flags = flags | Qt.WindowType.Window
         flags = flags & ~Qt.WindowType.WindowMaximizeButtonHint
@@ -29,52 +32,85 @@ class UpdateWidget(AsyncWidget):
         self.setWindowFlags(flags)
         self.ui = Ui_UpdateWidget()
         self.ui.setupUi(self)
+        self._description: str | None = None
 
-        self.ui.label.setText(self.tr("Found new version: {}").format(self.updater.remote_version))
-        self.ui.textBrowser.setMarkdown(self.updater.description)
+        # Repaint at most 30 times per second, however fast the chunks arrive
+        self.progress = ProgressReporter(self.on_progress)
 
         self.ui.cancel_btn.clicked.connect(self.on_cancel)
         self.ui.update_btn.clicked.connect(self.on_update)
+        self.reset(ready)
+
+    def reset(self, ready: bool = False):
+        self.need_restart = False
+        self.ready = ready
+        self.stage: PackageStage | None = None
+        self.progress.reset()
+        self.ui.cancel_btn.setEnabled(True)
+        self.ui.update_btn.setEnabled(True)
+        self.ui.progressBar.setRange(0, 100)
+        self.ui.progressBar.setFormat("%p%")
+        if self.ready:
+            self.ui.label.setText(
+                self.tr("New version {} is ready to install").format(
+                    self.updater.remote_version
+                )
+            )
+            self.ui.progressBar.setValue(100)
+        else:
+            self.ui.label.setText(self.tr("Found new version: {}").format(self.updater.remote_version))
+            self.ui.progressBar.setValue(0)
+        # Rendering the notes is the slow part, skip it for the same release
+        if self.updater.description != self._description:
+            self._description = self.updater.description
+            self.ui.textBrowser.setMarkdown(self._description)
 
     def on_cancel(self):
         self.close()
 
     @asyncSlot()
+    @span("UpdateWidget.on_update")
     async def on_update(self):
         self.ui.cancel_btn.setEnabled(False)
         self.ui.update_btn.setEnabled(False)
-        self.ui.label.setText(self.tr("Downloading new version..."))
-        await self.download()
-        self.ui.progressBar.setRange(0, 0)
-
-        self.ui.label.setText(self.tr("Extracting new version..."))
-        await to_thread(self.extract)
+        if not self.ready:
+            package = UpdatePackage(
+                self.updater,
+                on_stage=self.on_stage,
+                on_progress=self.progress.update,
+            )
+            await package.prepare()
+            self.progress.finish()
         self.need_restart = True
-        self.close()
-
-    async def download(self):
-        async with self.updater.create_async_client() as client:
-            async with client.stream("GET", self.updater.download_url, follow_redirects=True) as r:
-                r.raise_for_status()
-                total_size = int(r.headers.get("content-length", 0))
-                downloaded = 0
+        self.done(True)
 
-                with open(self.updater.filename, "wb") as f:
-                    async for chunk in r.aiter_bytes(8192):
-                        f.write(chunk)
-                        downloaded += len(chunk)
+    def on_stage(self, stage: PackageStage):
+        self.stage = stage
+        self.progress.reset()
+        self.ui.progressBar.setFormat("%p%")
+        match stage:
+            case PackageStage.DOWNLOAD:
+                self.ui.progressBar.setRange(0, 100)
+                self.ui.progressBar.setValue(0)
+                self.ui.label.setText(self.tr("Downloading new version..."))
+            case PackageStage.EXTRACT:
+                self.ui.progressBar.setRange(0, 0)
+                self.ui.label.setText(self.tr("Extracting new version..."))
+            case PackageStage.APPLY_DELTA:
+                self.ui.progressBar.setRange(0, 0)
+                self.ui.label.setText(self.tr("Applying update..."))
 
-                        percent = int(downloaded * 100 / total_size)
-                        self.ui.progressBar.setValue(percent)
-
-    def extract(self):
-        if self.updater.filename.endswith(".zip"):
-            import zipfile
-            with zipfile.ZipFile(self.updater.filename, 'r') as zip_ref:
-                zip_ref.extractall(os.path.dirname(self.updater.filename))
-        elif self.updater.filename.endswith(".tar.gz") or self.updater.filename.endswith(".tgz"):
-            import tarfile
-            with tarfile.open(self.updater.filename, 'r:gz') as tar_ref:
-                tar_ref.extractall(os.path.dirname(self.updater.filename))
-        else:
-            raise RuntimeError(f"Unsupported file format: {self.updater.filename}")
+    def on_progress(self, progress: Progress):
+        if progress.fraction is None:
+            # Unknown size, keep the busy indicator
+            self.ui.progressBar.setRange(0, 0)
+            return
+        self.ui.progressBar.setRange(0, 100)
+        self.ui.progressBar.setValue(int(progress.fraction * 100))
+        if self.stage != PackageStage.DOWNLOAD:
+            # Extraction counts files, not bytes
+            return
+        text = f"%p%  {format_size(progress.rate)}/s"
+        if progress.eta is not None:
+            text += f"  {format_eta(progress.eta)}"
+        self.ui.progressBar.setFormat(text)
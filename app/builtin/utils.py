@@ -1,6 +1,6 @@
-from app.builtin.github_updater import GithubUpdater
-from app.builtin.gitlab_updater import GitlabUpdater
 import app.builtin.config as cfg
+from app.builtin.asyncio import install_shutdown
+from app.builtin.trace import span
 
 import sys
 from pathlib import Path
@@ -10,10 +10,15 @@ from PySide6.QtWidgets import QApplication
 
 
 def get_updater():
+    # Only the chosen backend is imported, and only when it is used
     match cfg.UPDATER_REMOTE_TYPE:
         case "GitHub":
+            from app.builtin.github_updater import GithubUpdater
+
             updater = GithubUpdater()
         case "GitLab":
+            from app.builtin.gitlab_updater import GitlabUpdater
+
             updater = GitlabUpdater()
         case _:
             raise ValueError(
@@ -35,12 +40,16 @@ def running_in_bundle() -> bool:
 
 def init_app():
     # enable hdpi
-    enable_hi_dpi()
+    with span("enable_hi_dpi"):
+        enable_hi_dpi()
 
     # init QApplication
-    app = QApplication(sys.argv)
-    app.setApplicationName(cfg.APP_NAME)
-    app.setApplicationDisplayName(cfg.APP_DISPLAY_NAME)
-    app.setOrganizationName(cfg.ORG_NAME)
+    with span("create QApplication"):
+        app = QApplication(sys.argv)
+        app.setApplicationName(cfg.APP_NAME)
+        app.setApplicationDisplayName(cfg.APP_DISPLAY_NAME)
+        app.setOrganizationName(cfg.ORG_NAME)
+    # stop worker pools before the interpreter exits
+    install_shutdown(app)
 
     return app
@@ -1,26 +1,37 @@
+from __future__ import annotations
+
 import asyncio
 import os
+import random
+from typing import TYPE_CHECKING
 
+from PySide6.QtCore import Qt
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QMessageBox, QMainWindow
-from httpx import HTTPError
 from qasync import asyncSlot
-from qdarktheme import setup_theme
 
-import app.resources.resource  # type: ignore
-from app.builtin.update_widget import UpdateWidget
-from app.builtin.utils import get_updater
+from app.builtin.resources import APP_RESOURCES
+from app.builtin.theme import ThemeManager
+from app.builtin.trace import span
 from app.resources.main_window_ui import Ui_MainWindow
 
+# The updater and its UI are imported when an update check runs,
+# not before the first paint
+if TYPE_CHECKING:
+    from app.builtin.async_widget import WidgetPool
+    from app.builtin.update import Updater
+
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, updater: Updater | None = None):
         super().__init__()
+        self.updater = updater
+        # Created once an update is found, see `prewarm_update_widget()`
+        self.update_widgets: WidgetPool[bool] | None = None
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.ui.pushButton.clicked.connect(self.click_push_button)
 
-        # ThemeManager.instance().setup_theme("auto")
         self.ui.themeComboBox.addItem(self.tr("Auto"), "auto")
         self.ui.themeComboBox.addItem(self.tr("Light"), "light")
         self.ui.themeComboBox.addItem(self.tr("Dark"), "dark")
@@ -29,8 +40,17 @@ class MainWindow(QMainWindow):
         self.change_theme(0)
 
         self.setWindowTitle(self.tr("MainWindow"))
+        APP_RESOURCES.require("icons")
         self.setWindowIcon(QIcon(":/logo.png"))
 
+    def bring_to_front(self, args: list[str] | None = None):
+        """Show the window of this instance for a later launch with `args`."""
+        if self.isMinimized():
+            self.showNormal()
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
     async def async_init(self):
         if os.getenv("DEBUG", "0") == "1":
             # Debug mode
@@ -39,43 +59,59 @@ class MainWindow(QMainWindow):
             # Production mode
             await self.check_update()
 
+    @span("MainWindow.check_update")
     async def check_update(self):
-        updater = get_updater()
-        if not updater.is_enable:
+        updater = self.updater
+        if updater is None or not updater.is_enable:
             return
-        if not updater.is_updated:
-            try:
-                await updater.fetch()
-                if updater.check_for_update():
-                    update_widget = UpdateWidget(self, updater)
-                    await update_widget.async_show()
-                    if update_widget.need_restart:
-                        updater.apply_update()
-            except HTTPError:
-                QMessageBox.warning(
-                    self,
-                    self.tr("Warning"),
-                    self.tr("Failed to check for updates"),
-                )
-            except FileNotFoundError:
-                QMessageBox.warning(
-                    self,
-                    self.tr("Warning"),
-                    self.tr("No update files found"),
-                )
-            except Exception as e:
-                QMessageBox.warning(
-                    self,
-                    self.tr("Warning"),
-                    self.tr("Excepted unknown error: {}").format(str(e)),
-                )
-        else:
+        from app.builtin.update_scheduler import UpdateScheduler
+
+        # Check in the background, off the startup path,
+        # also right after an update so a long session keeps checking
+        self.update_scheduler = UpdateScheduler(updater, self)
+        self.update_scheduler.update_available.connect(self.prewarm_update_widget)
+        self.update_scheduler.update_ready.connect(self.show_prepared_update)
+        self.update_scheduler.check_failed.connect(self.show_update_error)
+        self.update_scheduler.start(delay=random.uniform(1, 10))
+        if updater.is_updated:
             QMessageBox.information(
                 self,
                 self.tr("Info"),
                 self.tr("Update completed"),
             )
 
+    def prewarm_update_widget(self) -> WidgetPool[bool]:
+        """
+        Build the update dialog while the package downloads, so showing it
+        costs no setupUi. Its UI is not imported until an update is found.
+        """
+        if self.update_widgets is None:
+            from app.builtin.async_widget import WidgetPool
+            from app.builtin.update_widget import UpdateWidget
+
+            updater = self.updater
+            self.update_widgets = WidgetPool(lambda: UpdateWidget(self, updater))
+            self.update_widgets.prewarm()
+        return self.update_widgets
+
+    def show_update_error(self, error: Exception):
+        if isinstance(error, FileNotFoundError):
+            text = self.tr("No update files found")
+        else:
+            text = self.tr("Excepted unknown error: {}").format(str(error))
+        # open() does not block the scheduler that emitted the error
+        box = QMessageBox(QMessageBox.Icon.Warning, self.tr("Warning"), text, parent=self)
+        box.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        box.open()
+
+    @asyncSlot()
+    async def show_prepared_update(self):
+        if await self.prewarm_update_widget().show(ready=True):
+            self.updater.apply_update()
+        else:
+            # Ask again after the next check, the prepared package is kept
+            self.update_scheduler.start()
+
     @asyncSlot()
     async def click_push_button(self):
         async def async_task():
@@ -88,4 +124,5 @@ class MainWindow(QMainWindow):
 
     def change_theme(self, index):
         theme = self.ui.themeComboBox.itemData(index)
-        setup_theme(theme)
+        with span("setup_theme", theme=theme):
+            ThemeManager().setup_theme(theme)
@@ -0,0 +1,95 @@
+import os
+from contextlib import contextmanager
+
+import pytest
+
+# Run Qt headless
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from app.builtin.update import ReleaseType, get_arch, get_sysname  # noqa: E402
+
+# Package asset of this platform, `from conftest import PACKAGE`
+PACKAGE = f"App-{get_sysname()}-{get_arch()}.zip"
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PySide6.QtWidgets import QApplication
+
+    from app.builtin.utils import init_app
+
+    app = QApplication.instance()
+    if app is None:
+        app = init_app()
+    return app
+
+
+@pytest.fixture(scope="session")
+def app_paths(qapp, tmp_path_factory):
+    from app.builtin.paths import AppPaths
+
+    # AppPaths is a singleton, the first base_dir wins for the whole session
+    return AppPaths(base_dir=tmp_path_factory.mktemp("app_data"))
+
+
+@pytest.fixture
+def release_server():
+    from release_server import ReleaseServer
+
+    return ReleaseServer()
+
+
+def write_tree(root, files: dict[str, bytes]):
+    for rel, data in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def read_tree(root) -> dict[str, bytes]:
+    """Contents of the files and symlinks below `root`, without the manifest."""
+    from app.builtin.manifest import iter_files
+
+    return {rel: (root / rel).read_bytes() for rel in iter_files(root)}
+
+
+@contextmanager
+def restored(updater):
+    """The updaters are singletons, undo the changes of a test afterward."""
+    state = dict(vars(updater))
+    try:
+        yield updater
+    finally:
+        vars(updater).clear()
+        vars(updater).update(state)
+
+
+@pytest.fixture
+def github(release_server, app_paths):
+    from app.builtin.github_updater import GithubUpdater
+
+    with restored(GithubUpdater()) as updater:
+        updater.base_url = release_server.github_url
+        updater.project_name = release_server.project_name
+        updater.release_type = ReleaseType.STABLE
+        updater.per_page = 10
+        updater.rollout_percentage = 100
+        updater.bandwidth_limit = 0
+        updater.metadata_cache.clear()
+        updater._client = release_server.client()
+        yield updater
+
+
+@pytest.fixture
+def gitlab(release_server, app_paths):
+    from app.builtin.gitlab_updater import GitlabUpdater
+
+    with restored(GitlabUpdater()) as updater:
+        updater.base_url = release_server.gitlab_url
+        updater.project_name = release_server.project_name
+        updater.project_id = None
+        updater.release_type = ReleaseType.STABLE
+        updater.metadata_cache.clear()
+        updater._forget_project_id()
+        updater._client = release_server.client()
+        yield updater
@@ -0,0 +1,310 @@
+"""
+Local stand-in for the GitHub and GitLab release APIs.
+
+Serves release JSON and Range-capable asset downloads through an
+`httpx.MockTransport`, so updaters and downloads can be tested and
+benchmarked without network:
+
+    server = ReleaseServer()
+    server.add_release("1.2.0", {"App-linux-x64.zip": data})
+    updater._client = server.client()
+
+GitHub routes (`github_url`):
+    GET  /repos/{project}/releases?per_page=&page=     paginated, `Link: rel="next"`
+
+GitLab routes (`gitlab_url`):
+    GET  /api/v4/projects?search=                      project search
+    GET  /api/v4/projects/{id}/releases?per_page=&page=
+
+Assets (`asset_url(tag, name)`):
+    HEAD/GET /download/{tag}/{name}                    `Range: bytes=a-b` returns 206
+
+Every response has an `ETag`, a matching `If-None-Match` returns 304.
+`latency` delays every request, `fail()` injects failures for
+matching requests, `corrupt()` flips a byte of the served assets,
+`bandwidth` limits asset streaming per connection.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from urllib.parse import quote, unquote
+
+import httpx
+
+GITHUB_URL = "https://api.github.local"
+GITLAB_URL = "https://gitlab.local"
+DOWNLOAD_URL = "https://download.local"
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def etag_of(data: bytes) -> str:
+    return f'"{hashlib.sha1(data).hexdigest()}"'
+
+
+class Failure:
+    def __init__(self, path: str, times: int, status: int | None, after: int | None):
+        # Substring of the request path
+        self.path = path
+        self.times = times
+        # None raises a transport error instead of returning a status
+        self.status = status
+        # Bytes streamed before the connection breaks, only without `status`
+        self.after = after
+
+
+class Corruption:
+    def __init__(self, path: str, offset: int, times: int):
+        self.path = path
+        # Offset of the flipped byte in the asset
+        self.offset = offset
+        self.times = times
+
+
+class ReleaseServer:
+    # Bytes per streamed chunk of an asset
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        project_name: str = "owner/project",
+        project_id: int = 1,
+        latency: float = 0,
+        bandwidth: int = 0,
+    ):
+        self.project_name = project_name
+        self.project_id = project_id
+        # Seconds before every response
+        self.latency = latency
+        # Bytes per second per connection, 0 is unlimited
+        self.bandwidth = bandwidth
+        # False ignores `Range` headers, like a server without range support
+        self.accept_ranges = True
+
+        self.releases: list[dict] = []
+        self.assets: dict[tuple[str, str], bytes] = {}
+        self.requests: list[httpx.Request] = []
+        self.active = 0
+        self.max_active = 0
+        self._failures: list[Failure] = []
+        self._corruptions: list[Corruption] = []
+
+    @property
+    def github_url(self) -> str:
+        return GITHUB_URL
+
+    @property
+    def gitlab_url(self) -> str:
+        return GITLAB_URL
+
+    @staticmethod
+    def asset_url(tag: str, name: str) -> str:
+        return f"{DOWNLOAD_URL}/download/{quote(tag)}/{quote(name)}"
+
+    def add_release(self, tag: str, assets: dict[str, bytes] | None = None, body: str = ""):
+        """Add a release, the newest release must be added last."""
+        assets = assets or {}
+        for name, data in assets.items():
+            self.assets[(tag, name)] = data
+        self.releases.insert(0, {"tag_name": tag, "body": body, "assets": list(assets)})
+
+    def fail(
+        self,
+        path: str,
+        times: int = 1,
+        status: int | None = 500,
+        after: int | None = None,
+    ):
+        """
+        Fail the next `times` requests whose path contains `path`,
+        with `status`, or with a dropped connection if `status` is None.
+        """
+        self._failures.append(Failure(path, times, status, after))
+
+    def corrupt(self, path: str, offset: int, times: int = 1):
+        """Flip the byte at `offset` in the next `times` asset responses that contain it."""
+        self._corruptions.append(Corruption(path, offset, times))
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def client(self, **kwargs) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=self.transport(), **kwargs)
+
+    def requests_to(self, path: str, method: str | None = None) -> list[httpx.Request]:
+        return [
+            r
+            for r in self.requests
+            if path in r.url.path and (method is None or r.method == method)
+        ]
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        failure = self._take_failure(request.url.path)
+        if failure is not None and failure.status is not None:
+            return httpx.Response(failure.status, request=request)
+        if failure is not None and failure.after is None:
+            raise httpx.ConnectError("Injected failure", request=request)
+
+        path = request.url.path
+        if request.url.host == "download.local" and path.startswith("/download/"):
+            return self._asset(request, failure)
+        if path == f"/repos/{self.project_name}/releases":
+            return self._json(request, *self._page(request, self._github_releases()))
+        if path == "/api/v4/projects":
+            return self._json(request, self._search(request.url.params.get("search")))
+        # The project is addressed by ID or by its URL-encoded path
+        if unquote(path) in {
+            f"/api/v4/projects/{self.project_id}/releases",
+            f"/api/v4/projects/{self.project_name}/releases",
+        }:
+            return self._json(request, *self._page(request, self._gitlab_releases()))
+        return httpx.Response(404, json={"message": "Not Found"}, request=request)
+
+    def _take_failure(self, path: str) -> Failure | None:
+        for failure in self._failures:
+            if failure.path in path and failure.times > 0:
+                failure.times -= 1
+                return failure
+        return None
+
+    def _github_releases(self) -> list[dict]:
+        return [
+            {
+                "tag_name": release["tag_name"],
+                "body": release["body"],
+                "assets": [
+                    {
+                        "name": name,
+                        "size": len(self.assets[(release["tag_name"], name)]),
+                        "browser_download_url": self.asset_url(release["tag_name"], name),
+                    }
+                    for name in release["assets"]
+                ],
+            }
+            for release in self.releases
+        ]
+
+    def _gitlab_releases(self) -> list[dict]:
+        return [
+            {
+                "tag_name": release["tag_name"],
+                "description": release["body"],
+                "assets": {
+                    "links": [
+                        {"name": name, "url": self.asset_url(release["tag_name"], name)}
+                        for name in release["assets"]
+                    ]
+                },
+            }
+            for release in self.releases
+        ]
+
+    def _search(self, term: str | None) -> list[dict]:
+        if term and term in self.project_name:
+            return [{"id": self.project_id, "path_with_namespace": self.project_name}]
+        return []
+
+    @staticmethod
+    def _page(request: httpx.Request, items: list) -> tuple[list, dict]:
+        per_page = int(request.url.params.get("per_page", 30))
+        page = int(request.url.params.get("page", 1))
+        headers = {}
+        if page * per_page < len(items):
+            next_url = request.url.copy_merge_params({"page": page + 1})
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return items[(page - 1) * per_page : page * per_page], headers
+
+    @staticmethod
+    def _json(request: httpx.Request, data, headers: dict | None = None) -> httpx.Response:
+        content = json.dumps(data).encode()
+        headers = {"ETag": etag_of(content), **(headers or {})}
+        if request.headers.get("If-None-Match") == headers["ETag"]:
+            return httpx.Response(304, headers=headers, request=request)
+        return httpx.Response(
+            200,
+            content=content,
+            headers={"Content-Type": "application/json", **headers},
+            request=request,
+        )
+
+    def _asset(self, request: httpx.Request, failure: Failure | None) -> httpx.Response:
+        _, _, tag, name = request.url.path.split("/", 3)
+        data = self.assets.get((unquote(tag), unquote(name)))
+        if data is None:
+            return httpx.Response(404, request=request)
+
+        headers = {"ETag": etag_of(data), "Content-Length": str(len(data))}
+        if self.accept_ranges:
+            headers["Accept-Ranges"] = "bytes"
+        if request.method == "HEAD":
+            return httpx.Response(200, headers=headers, request=request)
+
+        status = 200
+        start, end = 0, len(data) - 1
+        match = RANGE_RE.fullmatch(request.headers.get("Range", ""))
+        if self.accept_ranges and match:
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), end) if last else end
+            else:
+                start = max(0, len(data) - int(last))
+            if start > end:
+                headers["Content-Range"] = f"bytes */{len(data)}"
+                return httpx.Response(416, headers=headers, request=request)
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            headers["Content-Length"] = str(end - start + 1)
+
+        body = data[start : end + 1]
+        for corruption in self._corruptions:
+            if (
+                corruption.path in request.url.path
+                and corruption.times > 0
+                and start <= corruption.offset <= end
+            ):
+                corruption.times -= 1
+                body = bytearray(body)
+                body[corruption.offset - start] ^= 0xFF
+                body = bytes(body)
+        return httpx.Response(
+            status,
+            headers=headers,
+            stream=AssetStream(self, body, failure),
+            request=request,
+        )
+
+
+class AssetStream(httpx.AsyncByteStream):
+    def __init__(self, server: ReleaseServer, data: bytes, failure: Failure | None):
+        self.server = server
+        self.data = data
+        self.failure = failure
+
+    async def __aiter__(self):
+        server = self.server
+        server.active += 1
+        server.max_active = max(server.max_active, server.active)
+        try:
+            started = time.perf_counter()
+            for offset in range(0, len(self.data), server.chunk_size):
+                if self.failure is not None and offset >= self.failure.after:
+                    raise httpx.ReadError("Injected failure")
+                yield self.data[offset : offset + server.chunk_size]
+                if server.bandwidth:
+                    sent = offset + server.chunk_size
+                    delay = sent / server.bandwidth - (time.perf_counter() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    # Let other connections run, like a real socket would
+                    await asyncio.sleep(0)
+        finally:
+            server.active -= 1
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from PySide6.QtCore import SIGNAL
+from PySide6.QtTest import QTest
+
+from app.builtin.async_widget import AsyncWidget, WidgetPool
+
+
+class Dialog(AsyncWidget):
+    def __init__(self):
+        super().__init__(None)
+        self.resets = []
+
+    def reset(self, *args, **kwargs):
+        self.resets.append((args, kwargs))
+
+
+def show_and_close(widget, result):
+    async def main():
+        asyncio.get_running_loop().call_soon(widget.done, result)
+        return await widget.async_show()
+
+    return asyncio.run(main())
+
+
+def test_result(qapp):
+    widget = Dialog()
+
+    assert show_and_close(widget, 42) == 42
+    assert not widget.isVisible()
+    # Closed without `done()`
+    assert show_and_close(widget, None) is None
+    assert widget.receivers(SIGNAL("_closed()")) == 0
+
+
+def test_timeout_closes(qapp):
+    widget = Dialog()
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(widget.async_show(timeout=0.01))
+    assert not widget.isVisible()
+    assert widget.receivers(SIGNAL("_closed()")) == 0
+
+
+def test_cancel_closes(qapp):
+    widget = Dialog()
+
+    async def main():
+        task = asyncio.ensure_future(widget.async_show())
+        await asyncio.sleep(0)
+        assert widget.isVisible()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert not widget.isVisible()
+
+
+def test_pool_reuses_widgets(qapp):
+    created = []
+
+    def factory():
+        created.append(Dialog())
+        return created[-1]
+
+    pool = WidgetPool(factory)
+    pool.prewarm()
+    QTest.qWait(10)
+    assert len(created) == 1
+
+    async def main():
+        results = []
+        for i in range(3):
+            asyncio.get_running_loop().call_soon(created[0].done, i)
+            results.append(await pool.show(i, ready=True))
+        return results
+
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert len(created) == 1
+    assert created[0].resets[-1] == ((2,), {"ready": True})
+    pool.clear()
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.builtin.asyncio import (
+    POOLS,
+    OperationCancelled,
+    configure_executor,
+    current_token,
+    raise_if_cancelled,
+    run_in_executor,
+    shutdown_executors,
+    threadsafe_callback,
+)
+
+
+def wait_until_cancelled(started: threading.Event, stopped: threading.Event):
+    started.set()
+    try:
+        while True:
+            raise_if_cancelled()
+            threading.Event().wait(0.01)
+    finally:
+        stopped.set()
+
+
+@pytest.fixture
+def named_pool():
+    configure_executor("test", 2)
+    yield "test"
+    # Stops the pool too
+    configure_executor("test", 0)
+    del POOLS["test"]
+
+
+def test_named_pool(named_pool):
+    name = asyncio.run(run_in_executor(named_pool, lambda: threading.current_thread().name))
+
+    assert name.startswith("test-pool")
+
+
+def test_cancel_task():
+    started = threading.Event()
+    stopped = threading.Event()
+
+    async def main():
+        task = asyncio.ensure_future(
+            run_in_executor("io", wait_until_cancelled, started, stopped)
+        )
+        await asyncio.to_thread(started.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert stopped.wait(5)
+
+
+def test_shutdown_cancels_work():
+    started = threading.Event()
+    stopped = threading.Event()
+
+    async def main():
+        task = asyncio.ensure_future(
+            run_in_executor("io", wait_until_cancelled, started, stopped)
+        )
+        await asyncio.to_thread(started.wait)
+        shutdown_executors()
+        with pytest.raises(OperationCancelled):
+            await task
+
+    asyncio.run(main())
+    assert stopped.is_set()
+    assert current_token() is None
+
+
+def test_threadsafe_callback():
+    threads = []
+
+    async def main():
+        callback = threadsafe_callback(lambda: threads.append(threading.get_ident()))
+        await run_in_executor("cpu", callback)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert threads == [threading.get_ident()]
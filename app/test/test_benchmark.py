@@ -0,0 +1,220 @@
+"""
+Benchmarks for startup, updater and extraction hot paths.
+
+Save a baseline and fail later runs on a regression:
+
+    uv run pytest app/test/test_benchmark.py --benchmark-autosave
+    uv run pytest app/test/test_benchmark.py --benchmark-compare --benchmark-compare-fail=mean:15%
+"""
+
+import asyncio
+import io
+import os
+import random
+import subprocess
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+from conftest import PACKAGE
+
+TAG_TYPES = ["", "-stable", "-beta", "-alpha", "-dev", "-nightly"]
+
+
+def make_tags(count: int) -> list[str]:
+    rng = random.Random(0)
+    return [
+        f"{rng.randint(0, 9)}.{rng.randint(0, 99)}.{rng.randint(0, 999)}"
+        f"{rng.choice(TAG_TYPES)}"
+        for _ in range(count)
+    ]
+
+
+def make_payload(size: int) -> bytes:
+    # Half random, half repeated, so archives compress like real binaries
+    rng = random.Random(size)
+    return rng.randbytes(size // 2) + b"\0" * (size - size // 2)
+
+
+def make_tree(root, files: int = 300, size: int = 32 * 1024):
+    for i in range(files):
+        path = root / f"dir{i % 10}" / f"file{i}.bin"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(make_payload(size))
+
+
+@pytest.mark.benchmark(group="startup")
+def test_cold_start(benchmark):
+    script = (
+        "import os\n"
+        "from app.builtin.utils import init_app\n"
+        "from app.builtin.paths import AppPaths\n"
+        "from app.main_window import MainWindow\n"
+        "app = init_app()\n"
+        "AppPaths()\n"
+        "MainWindow().show()\n"
+        # Skip the Qt teardown, see test_startup.py
+        "os._exit(0)\n"
+    )
+    env = os.environ.copy()
+    env["QT_QPA_PLATFORM"] = "offscreen"
+
+    def run():
+        subprocess.run([sys.executable, "-c", script], env=env, check=True)
+
+    benchmark.pedantic(run, rounds=3, iterations=1)
+
+
+@pytest.mark.benchmark(group="startup")
+def test_main_window(benchmark, qapp, app_paths):
+    from app.main_window import MainWindow
+
+    def create():
+        window = MainWindow()
+        window.deleteLater()
+
+    benchmark(create)
+
+
+@pytest.mark.benchmark(group="startup")
+def test_theme_switch(benchmark, qapp, app_paths):
+    from PySide6.QtCore import QEvent
+
+    from app.builtin.theme import ThemeManager
+
+    # Windows left by other benchmarks would be repolished on every switch
+    qapp.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+    manager = ThemeManager()
+    themes = iter(["dark", "light"] * 100_000)
+
+    benchmark(lambda: manager.setup_theme(next(themes)))
+
+
+@pytest.mark.benchmark(group="updater")
+def test_version_parse(benchmark):
+    from app.builtin.update import Version, _parse_version
+
+    tags = make_tags(5000)
+
+    def parse():
+        _parse_version.cache_clear()
+        return [Version(tag) for tag in tags]
+
+    benchmark(parse)
+
+
+@pytest.mark.benchmark(group="updater")
+def test_newest_in_channel(benchmark):
+    from app.builtin.update import ReleaseType, newest_in_channel
+
+    tags = make_tags(5000)
+    benchmark(newest_in_channel, tags, ReleaseType.BETA)
+
+
+def fetch_benchmark(benchmark, updater, release_server, expected: str):
+    async def fetch():
+        updater._client = release_server.client()
+        updater.metadata_cache.clear()
+        await updater.fetch()
+        await updater.aclose()
+
+    benchmark(lambda: asyncio.run(fetch()))
+    assert str(updater.remote_version) == expected
+
+
+@pytest.mark.benchmark(group="updater")
+def test_github_fetch(benchmark, release_server, github):
+    release_server.add_release("0.9.0", {PACKAGE: b""})
+    for i in range(500):
+        release_server.add_release(f"1.{i}.0-nightly", {PACKAGE: b""})
+    # The default page size of `GithubUpdater`
+    github.per_page = 100
+    fetch_benchmark(benchmark, github, release_server, "0.9.0-stable")
+
+
+@pytest.mark.benchmark(group="updater")
+def test_gitlab_fetch(benchmark, release_server, gitlab):
+    for i in range(100):
+        release_server.add_release(f"1.{i}.0", {PACKAGE: b""})
+    gitlab.project_id = release_server.project_id
+    fetch_benchmark(benchmark, gitlab, release_server, "1.99.0-stable")
+
+
+@pytest.mark.benchmark(group="updater")
+@pytest.mark.parametrize("connections", [1, 4])
+def test_download(benchmark, tmp_path, release_server, connections):
+    from app.builtin.download import RangedDownloader
+
+    package = make_payload(16 * 1024 * 1024)
+    release_server.add_release("0.9.0", {PACKAGE: package})
+
+    async def download():
+        async with release_server.client() as client:
+            await RangedDownloader(
+                client,
+                release_server.asset_url("0.9.0", PACKAGE),
+                tmp_path / PACKAGE,
+                total_size=len(package),
+                accept_ranges=True,
+                connections=connections,
+            ).run()
+
+    benchmark(lambda: asyncio.run(download()))
+    assert (tmp_path / PACKAGE).read_bytes() == package
+
+
+@pytest.mark.benchmark(group="extract")
+def test_extract_zip(benchmark, tmp_path):
+    from app.builtin.extract import extract_archive
+
+    archive = tmp_path / "App.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(300):
+            zf.writestr(f"App/dir{i % 10}/file{i}.bin", make_payload(64 * 1024))
+    counter = iter(range(1 << 30))
+    benchmark(lambda: extract_archive(archive, tmp_path / f"out{next(counter)}"))
+
+
+@pytest.mark.benchmark(group="extract")
+def test_extract_tar(benchmark, tmp_path):
+    from app.builtin.extract import extract_archive
+
+    archive = tmp_path / "App.tar.gz"
+    with tarfile.open(archive, "w:gz") as tf:
+        for i in range(300):
+            data = make_payload(64 * 1024)
+            info = tarfile.TarInfo(f"App/dir{i % 10}/file{i}.bin")
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    counter = iter(range(1 << 30))
+    benchmark(lambda: extract_archive(archive, tmp_path / f"out{next(counter)}"))
+
+
+@pytest.mark.benchmark(group="install")
+def test_install_tree(benchmark, tmp_path):
+    from app.builtin.install import TreeInstaller
+
+    counter = iter(range(1 << 30))
+
+    def setup():
+        root = tmp_path / str(next(counter))
+        make_tree(root / "new")
+        make_tree(root / "old")
+        return (root / "new", root / "old"), {}
+
+    benchmark.pedantic(
+        lambda new, old: TreeInstaller(new, old).install(),
+        setup=setup,
+        rounds=5,
+    )
+
+
+@pytest.mark.benchmark(group="install")
+def test_copy_tree(benchmark, tmp_path):
+    from app.builtin.install import copy_tree_parallel
+
+    make_tree(tmp_path / "src")
+    counter = iter(range(1 << 30))
+    benchmark(lambda: copy_tree_parallel(tmp_path / "src", tmp_path / str(next(counter))))
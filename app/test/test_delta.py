@@ -0,0 +1,78 @@
+import os
+import zipfile
+
+import pytest
+
+from app.builtin.delta import DeltaError, apply_delta, create_delta
+from app.builtin.manifest import MANIFEST_NAME, load_manifest
+from conftest import read_tree, write_tree
+
+
+@pytest.fixture
+def releases(tmp_path):
+    old = {"App": b"old binary", "lib/a.so": b"a", "lib/removed.so": b"removed"}
+    new = {"App": b"new binary", "lib/a.so": b"a", "lib/added.so": b"added"}
+    write_tree(tmp_path / "old", old)
+    write_tree(tmp_path / "new", new)
+    create_delta(tmp_path / "old", tmp_path / "new", tmp_path / "delta.zip")
+    return tmp_path / "old", new, tmp_path / "delta.zip"
+
+
+def test_apply_delta(releases, tmp_path):
+    installed, new, delta = releases
+
+    with zipfile.ZipFile(delta) as zf:
+        names = set(zf.namelist())
+    # Only the changed and added files are shipped
+    assert names == {MANIFEST_NAME, "files/App", "files/lib/added.so"}
+
+    apply_delta(delta, installed, tmp_path / "target")
+
+    assert read_tree(tmp_path / "target") == new
+    assert set(load_manifest(tmp_path / "target" / MANIFEST_NAME)) == set(new)
+
+
+@pytest.mark.parametrize("change", ["modified", "missing"])
+def test_apply_delta_base_mismatch(releases, tmp_path, change):
+    installed, _, delta = releases
+    if change == "modified":
+        (installed / "lib/a.so").write_bytes(b"patched")
+    else:
+        (installed / "lib/a.so").unlink()
+
+    with pytest.raises(DeltaError, match="lib/a.so"):
+        apply_delta(delta, installed, tmp_path / "target")
+    assert not (tmp_path / "target").exists()
+
+
+def test_apply_delta_corrupt(releases, tmp_path):
+    installed, _, delta = releases
+    delta.write_bytes(delta.read_bytes()[:100])
+
+    with pytest.raises(DeltaError):
+        apply_delta(delta, installed, tmp_path / "target")
+    assert not (tmp_path / "target").exists()
+
+
+def test_apply_delta_symlinks(tmp_path):
+    write_tree(tmp_path / "old", {"lib/a.so.1": b"a1"})
+    (tmp_path / "old/lib/a.so").symlink_to("a.so.1")
+    write_tree(tmp_path / "new", {"lib/a.so.2": b"a2"})
+    (tmp_path / "new/lib/a.so").symlink_to("a.so.2")
+    create_delta(tmp_path / "old", tmp_path / "new", tmp_path / "delta.zip")
+
+    apply_delta(tmp_path / "delta.zip", tmp_path / "old", tmp_path / "target")
+
+    assert os.readlink(tmp_path / "target/lib/a.so") == "a.so.2"
+    assert read_tree(tmp_path / "target") == {"lib/a.so": b"a2", "lib/a.so.2": b"a2"}
+
+
+def test_apply_delta_rejects_escaping_symlink(tmp_path):
+    write_tree(tmp_path / "old", {"App": b"old"})
+    write_tree(tmp_path / "new", {"App": b"new"})
+    (tmp_path / "new/data").symlink_to("../../etc")
+    create_delta(tmp_path / "old", tmp_path / "new", tmp_path / "delta.zip")
+
+    with pytest.raises(DeltaError, match="data"):
+        apply_delta(tmp_path / "delta.zip", tmp_path / "old", tmp_path / "target")
+    assert not (tmp_path / "target").exists()
@@ -0,0 +1,139 @@
+import asyncio
+import io
+import tarfile
+import threading
+import zipfile
+
+import pytest
+
+from app.builtin.extract import StreamPipe, extract_tar_stream, extract_zip_parallel
+
+
+def tar_package(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tf:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def test_stream_pipe_read():
+    pipe = StreamPipe()
+    pipe.write(b"abc")
+    pipe.write(b"")
+    pipe.write(b"def")
+    pipe.close()
+
+    assert pipe.read(2) == b"ab"
+    assert pipe.read() == b"cdef"
+    assert pipe.read() == b""
+
+
+def test_stream_pipe_abort():
+    pipe = StreamPipe()
+    pipe.write(b"abc")
+    pipe.abort(ValueError("failed"))
+
+    with pytest.raises(ValueError):
+        pipe.read()
+    assert pipe.read() == b""
+
+
+def test_stream_pipe_backpressure():
+    pipe = StreamPipe(max_chunks=2)
+
+    async def main():
+        for _ in range(2):
+            await pipe.write_async(b"x")
+        write = asyncio.ensure_future(pipe.write_async(b"y"))
+        await asyncio.sleep(0.05)
+        # The pipe is full, the writer waits and the loop keeps running
+        assert not write.done()
+
+        reader = threading.Thread(target=pipe.read, args=(1,))
+        reader.start()
+        await asyncio.wait_for(write, 1)
+        reader.join()
+        pipe.close()
+
+    asyncio.run(main())
+    assert pipe.read() == b"xy"
+
+
+def test_stream_pipe_blocking_write():
+    pipe = StreamPipe(max_chunks=1)
+    pipe.write(b"a")
+    writer = threading.Thread(target=pipe.write, args=(b"b",))
+    writer.start()
+    writer.join(0.05)
+    assert writer.is_alive()
+
+    assert pipe.read(1) == b"a"
+    writer.join(1)
+    assert not writer.is_alive()
+
+
+def test_stream_pipe_reader_fails(tmp_path):
+    pipe = StreamPipe(max_chunks=2)
+
+    async def main():
+        extract = asyncio.ensure_future(
+            asyncio.to_thread(extract_tar_stream, pipe, tmp_path)
+        )
+        with pytest.raises(BrokenPipeError):
+            # Blocked on a full pipe until the reader gives up
+            for _ in range(100):
+                await asyncio.wait_for(pipe.write_async(b"not a tar.gz" * 1000), 1)
+        with pytest.raises(tarfile.ReadError):
+            await extract
+
+    asyncio.run(main())
+
+
+def test_extract_tar_stream(tmp_path):
+    data = tar_package({"App/app": b"binary", "App/lib/a.so": b"a" * 100_000})
+    pipe = StreamPipe(max_chunks=2)
+    extract = threading.Thread(target=extract_tar_stream, args=(pipe, tmp_path))
+    extract.start()
+    for offset in range(0, len(data), 1024):
+        pipe.write(data[offset : offset + 1024])
+    pipe.close()
+    extract.join(5)
+
+    assert (tmp_path / "App/app").read_bytes() == b"binary"
+    assert (tmp_path / "App/lib/a.so").read_bytes() == b"a" * 100_000
+
+
+def test_extract_tar_stream_rejects_traversal(tmp_path):
+    pipe = StreamPipe()
+    pipe.write(tar_package({"../evil": b"evil"}))
+    pipe.close()
+
+    with pytest.raises(tarfile.OutsideDestinationError):
+        extract_tar_stream(pipe, tmp_path / "dest")
+    assert not (tmp_path / "evil").exists()
+
+
+@pytest.mark.parametrize("damage", ["corrupt", "truncated"])
+def test_extract_zip_rejects_bad_member(tmp_path, damage):
+    payload = bytes(range(256)) * 64
+    archive = tmp_path / "App.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr("App/app", b"binary")
+        zf.writestr("App/lib/a.so", payload)
+    data = bytearray(archive.read_bytes())
+    offset = data.find(payload)
+    if damage == "corrupt":
+        data[offset + 1000] ^= 0xFF
+    else:
+        # The central directory claims more data than the member has
+        # The last central directory header is the one of "App/lib/a.so"
+        header = data.rfind(b"PK\x01\x02")
+        size = int.from_bytes(data[header + 24 : header + 28], "little")
+        data[header + 24 : header + 28] = (size + 1000).to_bytes(4, "little")
+    archive.write_bytes(data)
+
+    with pytest.raises(zipfile.BadZipFile, match="App/lib/a.so"):
+        extract_zip_parallel(archive, tmp_path / "out", workers=2)
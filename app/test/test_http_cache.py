@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from app.builtin.http_cache import MetadataCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return MetadataCache(tmp_path / "http_cache.json")
+
+
+def get_releases(server, cache: MetadataCache):
+    async def main():
+        async with server.client() as client:
+            return await cache.get_json(
+                client,
+                f"{server.github_url}/repos/{server.project_name}/releases",
+                params={"per_page": 10},
+            )
+
+    return asyncio.run(main())
+
+
+def test_revalidate(release_server, cache):
+    release_server.add_release("0.9.0")
+
+    first = get_releases(release_server, cache)
+    # A new instance loads the entries from the file
+    second = get_releases(release_server, MetadataCache(cache.file))
+
+    assert not first.from_cache
+    assert second.from_cache
+    assert second.data == first.data
+    first_request, second_request = release_server.requests
+    assert "If-None-Match" not in first_request.headers
+    assert second_request.headers["If-None-Match"]
+
+
+def test_revalidate_changed(release_server, cache):
+    release_server.add_release("0.9.0")
+    get_releases(release_server, cache)
+    release_server.add_release("1.0.0")
+
+    r = get_releases(release_server, cache)
+
+    assert not r.from_cache
+    assert r.data[0]["tag_name"] == "1.0.0"
+
+
+def test_ttl(release_server, cache, monkeypatch):
+    release_server.add_release("0.9.0")
+    now = [1000.0]
+    monkeypatch.setattr("app.builtin.http_cache.time.time", lambda: now[0])
+    cache.ttl = 60
+
+    get_releases(release_server, cache)
+    now[0] += 59
+    assert get_releases(release_server, cache).from_cache
+    # Within the TTL nothing is sent
+    assert len(release_server.requests) == 1
+
+    now[0] += 2
+    assert get_releases(release_server, cache).from_cache
+    assert len(release_server.requests) == 2
+    assert "If-None-Match" in release_server.requests[1].headers
+    # The 304 starts a new TTL
+    now[0] += 59
+    get_releases(release_server, cache)
+    assert len(release_server.requests) == 2
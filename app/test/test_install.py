@@ -0,0 +1,176 @@
+import os
+
+import pytest
+
+from app.builtin.install import (
+    BACKUP_DIR_NAME,
+    INSTALL_LOCK_NAME,
+    InstallError,
+    TreeInstaller,
+    recover_install,
+)
+from app.builtin.manifest import (
+    MANIFEST_NAME,
+    build_manifest,
+    dump_manifest,
+    load_manifest,
+)
+from conftest import read_tree, write_tree
+
+
+class Crash(BaseException):
+    """Stands in for the process dying, nothing catches it."""
+
+
+def write_manifest(root):
+    dump_manifest(build_manifest(root), root / MANIFEST_NAME)
+
+
+OLD = {"App": b"old binary", "lib/a.so": b"old a", "obsolete.txt": b"obsolete"}
+NEW = {"App": b"new binary", "lib/a.so": b"new a", "lib/b.so": b"new b"}
+
+
+@pytest.fixture
+def trees(tmp_path):
+    write_tree(tmp_path / "new", NEW)
+    write_tree(tmp_path / "installed", OLD)
+    return tmp_path / "new", tmp_path / "installed"
+
+
+def fail_on(monkeypatch, name: str, error: BaseException):
+    place = TreeInstaller._place
+
+    def fail(self, rel):
+        if rel == name:
+            raise error
+        place(self, rel)
+
+    monkeypatch.setattr(TreeInstaller, "_place", fail)
+
+
+def test_install(trees):
+    new, installed = trees
+
+    TreeInstaller(new, installed).install(remove=["obsolete.txt"])
+
+    assert read_tree(installed) == NEW
+    assert not (installed / BACKUP_DIR_NAME).exists()
+
+
+def test_install_rollback(trees, monkeypatch):
+    new, installed = trees
+    # "App" is already replaced when "lib" fails
+    fail_on(monkeypatch, "lib", OSError("disk full"))
+
+    with pytest.raises(InstallError):
+        TreeInstaller(new, installed).install(remove=["obsolete.txt"])
+
+    assert read_tree(installed) == OLD
+    assert not (installed / BACKUP_DIR_NAME).exists()
+
+
+def test_recover_install(trees, monkeypatch):
+    new, installed = trees
+    fail_on(monkeypatch, "lib", Crash())
+
+    with pytest.raises(Crash):
+        TreeInstaller(new, installed).install(remove=["obsolete.txt"])
+    # The tree is half replaced, the journal is left behind
+    assert read_tree(installed) != OLD
+    assert (installed / BACKUP_DIR_NAME / "journal.json").is_file()
+
+    assert recover_install(installed)
+
+    assert read_tree(installed) == OLD
+    assert not (installed / BACKUP_DIR_NAME).exists()
+    assert not recover_install(installed)
+
+
+def test_recover_install_skips_running_install(trees, monkeypatch):
+    from PySide6.QtCore import QLockFile
+
+    new, installed = trees
+    fail_on(monkeypatch, "lib", Crash())
+    with pytest.raises(Crash):
+        TreeInstaller(new, installed).install(remove=["obsolete.txt"])
+    # Another process is still installing
+    lock = QLockFile(str(installed / INSTALL_LOCK_NAME))
+    assert lock.tryLock(0)
+    half_installed = read_tree(installed)
+    try:
+        assert not recover_install(installed)
+        assert read_tree(installed) == half_installed
+        installer = TreeInstaller(new, installed)
+        installer.lock_timeout = 0
+        with pytest.raises(InstallError):
+            installer.install()
+    finally:
+        lock.unlock()
+
+    assert recover_install(installed)
+    assert read_tree(installed) == OLD
+
+
+def test_install_changed(tmp_path, monkeypatch):
+    new = {"App": b"new binary", "lib/a.so": b"old a", "lib/b.so": b"new b"}
+    write_tree(tmp_path / "new", new)
+    write_tree(tmp_path / "installed", OLD)
+    write_manifest(tmp_path / "new")
+    write_manifest(tmp_path / "installed")
+    unchanged = (tmp_path / "installed" / "lib/a.so").stat()
+    placed = []
+    place = TreeInstaller._place
+
+    def record(self, rel):
+        placed.append(rel)
+        place(self, rel)
+
+    monkeypatch.setattr(TreeInstaller, "_place", record)
+
+    TreeInstaller(tmp_path / "new", tmp_path / "installed").install_changed()
+
+    installed = read_tree(tmp_path / "installed")
+    assert set(placed) == {"App", "lib/b.so"}
+    # Unchanged files are not touched, removed files are deleted
+    assert (tmp_path / "installed" / "lib/a.so").stat().st_ino == unchanged.st_ino
+    assert "obsolete.txt" not in installed
+    assert installed == new
+    assert set(load_manifest(tmp_path / "installed" / MANIFEST_NAME)) == set(new)
+    assert not (tmp_path / "installed" / BACKUP_DIR_NAME).exists()
+
+
+def test_install_changed_rehashes_modified_files(tmp_path):
+    write_tree(tmp_path / "new", OLD)
+    write_tree(tmp_path / "installed", OLD)
+    write_manifest(tmp_path / "new")
+    write_manifest(tmp_path / "installed")
+    # Modified after the install, the manifest still has the old hash
+    (tmp_path / "installed" / "App").write_bytes(b"patched binary")
+
+    TreeInstaller(tmp_path / "new", tmp_path / "installed").install_changed()
+
+    assert (tmp_path / "installed" / "App").read_bytes() == OLD["App"]
+
+
+def test_install_changed_symlinks(tmp_path):
+    write_tree(tmp_path / "new", {"lib/a.so.2": b"a2", "lib/b.so.1": b"b1"})
+    (tmp_path / "new/lib/a.so").symlink_to("a.so.2")
+    (tmp_path / "new/lib/b.so").symlink_to("b.so.1")
+    write_tree(tmp_path / "installed", {"lib/a.so.1": b"a1", "lib/b.so.1": b"b1"})
+    (tmp_path / "installed/lib/a.so").symlink_to("a.so.1")
+    (tmp_path / "installed/lib/b.so").symlink_to("b.so.1")
+    (tmp_path / "installed/lib/old.so").symlink_to("a.so.1")
+    write_manifest(tmp_path / "new")
+    write_manifest(tmp_path / "installed")
+    unchanged = (tmp_path / "installed/lib/b.so").lstat()
+
+    TreeInstaller(tmp_path / "new", tmp_path / "installed").install_changed()
+
+    lib = tmp_path / "installed/lib"
+    assert os.readlink(lib / "a.so") == "a.so.2"
+    assert (lib / "b.so").lstat().st_ino == unchanged.st_ino
+    assert not (lib / "old.so").is_symlink()
+    assert not (lib / "a.so.1").exists()
+    assert load_manifest(tmp_path / "installed" / MANIFEST_NAME)["lib/a.so"] == {
+        "symlink": "a.so.2"
+    }
@@ -0,0 +1,60 @@
+from app.builtin.progress import ProgressReporter, format_eta, format_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_reporter(fps=10):
+    reports = []
+    reporter = ProgressReporter(reports.append, fps=fps)
+    reporter.clock = FakeClock()
+    return reporter, reports
+
+
+def test_coalesce():
+    reporter, reports = make_reporter(fps=10)
+
+    for i in range(1, 1001):
+        reporter.clock.now = i / 1000
+        reporter.update(i * 1000, 1_000_000)
+    reporter.finish()
+
+    # One update per 100 ms, plus the last one
+    assert len(reports) == 11
+    assert reports[-1].done == 1_000_000
+    assert reports[-1].fraction == 1.0
+
+
+def test_rate_and_eta():
+    reporter, reports = make_reporter()
+
+    for second in range(5):
+        reporter.clock.now = second
+        reporter.update(second * 1000, 10_000)
+
+    assert reports[-1].rate == 1000
+    assert reports[-1].eta == 6
+
+
+def test_unknown_total():
+    reporter, reports = make_reporter()
+
+    reporter.update(0)
+    reporter.clock.now = 1
+    reporter.update(500)
+
+    assert reports[-1].fraction is None
+    assert reports[-1].eta is None
+    assert reports[-1].rate == 500
+
+
+def test_format():
+    assert format_size(512) == "512 B"
+    assert format_size(3 * 1024 * 1024) == "3.0 MiB"
+    assert format_eta(75) == "1:15"
+    assert format_eta(3600) == "1:00:00"
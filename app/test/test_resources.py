@@ -0,0 +1,50 @@
+import uuid
+
+from PySide6.QtCore import QFile
+
+from app.builtin.resources import ResourceLoader, build_rcc, collect_groups
+
+
+def make_assets(root, name):
+    (root / "qml").mkdir(parents=True)
+    (root / f"{name}.txt").write_text("icon")
+    (root / "qml" / f"{name}.qml").write_text("qml")
+
+
+def test_collect_groups(tmp_path):
+    make_assets(tmp_path, "a")
+
+    groups = collect_groups(tmp_path)
+
+    assert {group: [p.as_posix() for p in files] for group, files in groups.items()} == {
+        "icons": ["a.txt"],
+        "qml": ["qml/a.qml"],
+    }
+
+
+def test_register_groups_lazily(tmp_path):
+    # Resource paths are global, use names no other test registers
+    name = uuid.uuid4().hex
+    make_assets(tmp_path / "assets", name)
+    build_rcc(tmp_path / "assets", tmp_path / "rcc")
+    fallback = []
+    loader = ResourceLoader(tmp_path / "rcc", lambda: fallback.append(True))
+
+    loader.require("qml")
+
+    assert QFile.exists(f":/qml/{name}.qml")
+    assert not QFile.exists(f":/{name}.txt")
+    loader.require("icons")
+    assert QFile.exists(f":/{name}.txt")
+    assert not fallback
+
+
+def test_fallback(tmp_path):
+    fallback = []
+    loader = ResourceLoader(tmp_path, lambda: fallback.append(True))
+
+    loader.require("icons")
+    loader.require("i18n")
+
+    assert fallback == [True]
+    assert loader.fallback_used
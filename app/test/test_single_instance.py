@@ -0,0 +1,92 @@
+import json
+import subprocess
+import sys
+import uuid
+
+from PySide6.QtCore import QDeadlineTimer
+from PySide6.QtTest import QTest
+
+from app.builtin.single_instance import SingleInstance
+
+SECONDARY = """
+import json
+import sys
+
+from app.builtin.single_instance import SingleInstance
+
+instance = SingleInstance(sys.argv[1])
+if instance.acquire():
+    sys.exit(2)
+sent = instance.forward(sys.argv[2:])
+print(json.dumps("PySide6.QtWidgets" in sys.modules), flush=True)
+sys.exit(0 if sent else 1)
+"""
+
+
+def test_forward_to_first_instance(qapp):
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    instance = SingleInstance(name)
+    assert instance.acquire()
+    assert instance.listen()
+    received = []
+    instance.message_received.connect(received.append)
+    try:
+        process = subprocess.Popen(
+            [sys.executable, "-c", SECONDARY, name, "--open", "file.txt"],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        deadline = QDeadlineTimer(10_000)
+        while not received and not deadline.hasExpired():
+            QTest.qWait(10)
+        stdout, _ = process.communicate(timeout=10)
+    finally:
+        instance.release()
+
+    assert process.returncode == 0
+    assert received == [["--open", "file.txt"]]
+    # The check runs before widgets are imported
+    assert json.loads(stdout) is False
+
+
+def test_lock_released(qapp):
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    first = SingleInstance(name)
+    assert first.acquire()
+    assert not SingleInstance(name).acquire()
+
+    first.release()
+
+    second = SingleInstance(name)
+    assert second.acquire()
+    second.release()
+
+
+HOLDER = """
+import sys
+import time
+
+from app.builtin.single_instance import SingleInstance
+
+instance = SingleInstance(sys.argv[1])
+assert instance.acquire()
+print("locked", flush=True)
+time.sleep(0.5)
+# Exits without release(), like an updater process that ends
+"""
+
+
+def test_acquire_waits_for_exiting_instance(qapp):
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    process = subprocess.Popen(
+        [sys.executable, "-c", HOLDER, name], stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert process.stdout.readline().strip() == "locked"
+        instance = SingleInstance(name)
+        assert not instance.acquire()
+
+        assert instance.acquire(timeout=10)
+        instance.release()
+    finally:
+        process.wait(timeout=10)
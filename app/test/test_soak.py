@@ -0,0 +1,145 @@
+"""
+Repeat long-session flows and check that memory and QObjects stay bounded.
+Runs under the offscreen platform like the other tests.
+"""
+
+import asyncio
+import gc
+import tracemalloc
+
+from PySide6.QtCore import QCoreApplication, QEvent
+
+from app.builtin.diagnostics import MemoryMonitor, count_qobjects
+from app.builtin.update import Version
+from conftest import PACKAGE
+
+
+def settle():
+    QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+    gc.collect()
+
+
+def soak(flow, iterations: int, warmup: int = 50) -> tuple[int, dict[str, int]]:
+    """Run `flow`, return the traced memory growth and the QObject classes that grew."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        for i in range(warmup):
+            flow(i)
+        settle()
+        before_objects = count_qobjects()
+        before, _ = tracemalloc.get_traced_memory()
+        for i in range(iterations):
+            flow(i)
+        settle()
+        after, _ = tracemalloc.get_traced_memory()
+        after_objects = count_qobjects()
+    finally:
+        if started:
+            tracemalloc.stop()
+    # Classes with more live objects, Qt deletes some internal ones lazily
+    grown = {
+        name: after_objects[name] - before_objects[name]
+        for name in after_objects
+        if after_objects[name] > before_objects[name]
+    }
+    return after - before, grown
+
+
+def test_soak_async_show(qapp, github):
+    from app.builtin.async_widget import WidgetPool
+    from app.builtin.update_widget import UpdateWidget
+
+    github.remote_version = Version("1.0.0")
+    github.description = "# Notes\n\n- Fixes"
+    widgets = []
+    pool = WidgetPool(lambda: widgets.append(UpdateWidget(None, github)) or widgets[-1])
+    loop = asyncio.new_event_loop()
+
+    async def answer(ready: bool):
+        task = asyncio.ensure_future(pool.show(ready=ready))
+        await asyncio.sleep(0)
+        widgets[-1].done(ready)
+        assert await task is ready
+
+    def flow(i):
+        loop.run_until_complete(answer(i % 2 == 0))
+
+    try:
+        growth, grown = soak(flow, 2000)
+    finally:
+        loop.close()
+        pool.clear()
+
+    assert len(widgets) == 1
+    assert growth < 256 * 1024
+    assert not grown
+
+
+def test_soak_theme_switch(qapp, app_paths):
+    from app.builtin.theme import ThemeManager
+    from app.main_window import MainWindow
+
+    window = MainWindow()
+    manager = ThemeManager()
+
+    def flow(i):
+        manager.setup_theme(("dark", "light", "auto")[i % 3])
+
+    try:
+        growth, grown = soak(flow, 1000)
+    finally:
+        window.deleteLater()
+
+    assert growth < 256 * 1024
+    assert not grown
+
+
+def test_soak_update_check(qapp, release_server, github):
+    release_server.add_release("0.9.0", {PACKAGE: b"stable"})
+    loop = asyncio.new_event_loop()
+
+    def flow(i):
+        loop.run_until_complete(github.fetch())
+        github.check_for_update()
+        # The server logs every request
+        release_server.requests.clear()
+
+    try:
+        growth, grown = soak(flow, 1000)
+    finally:
+        loop.run_until_complete(github.aclose())
+        loop.close()
+
+    assert growth < 512 * 1024
+    assert not grown
+
+
+def test_monitor_writes_samples(qapp, tmp_path):
+    monitor = MemoryMonitor(tmp_path / "diagnostics.jsonl")
+    monitor.start(3600)
+    try:
+        leak = [bytearray(1024) for _ in range(1000)]
+        record = monitor.sample()
+    finally:
+        monitor.stop()
+
+    assert record["traced"] >= 1000 * 1024
+    assert any(__file__ in site["where"][0] for site in record["top"])
+    assert (tmp_path / "diagnostics.jsonl").read_text().count("\n") == 1
+    del leak
+
+
+def test_monitor_keeps_foreign_tracing(qapp, tmp_path):
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        monitor = MemoryMonitor(tmp_path / "diagnostics.jsonl")
+        monitor.start(3600)
+        monitor.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        if started:
+            tracemalloc.stop()
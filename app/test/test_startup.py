@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+# Modules that must not be loaded before the main window is shown
+LAZY_MODULES = [
+    "httpx",
+    "psutil",
+    "glom",
+    "app.builtin.update",
+    "app.builtin.github_updater",
+    "app.builtin.gitlab_updater",
+    "app.builtin.update_widget",
+    "app.builtin.update_scheduler",
+]
+# Total number of modules in `sys.modules` after `MainWindow.show()`
+MODULE_BUDGET = 320
+
+SCRIPT = """
+import json
+import os
+import sys
+
+from app.builtin.utils import init_app
+from app.builtin.paths import AppPaths
+from app.main_window import MainWindow
+
+app = init_app()
+AppPaths()
+main_window = MainWindow()
+main_window.show()
+print(json.dumps(sorted(sys.modules)), flush=True)
+# Skip the Qt teardown, it randomly crashes or hangs with the offscreen platform
+os._exit(0)
+"""
+
+
+def modules_before_show() -> list[str]:
+    env = os.environ.copy()
+    env["QT_QPA_PLATFORM"] = "offscreen"
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+        timeout=60,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_startup_imports():
+    modules = modules_before_show()
+    loaded = [name for name in LAZY_MODULES if name in modules]
+    assert not loaded, f"Imported before the first paint: {loaded}"
+    assert len(modules) <= MODULE_BUDGET, (
+        f"{len(modules)} modules imported before the first paint, "
+        f"budget is {MODULE_BUDGET}"
+    )
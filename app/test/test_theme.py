@@ -0,0 +1,106 @@
+import os
+
+import qdarktheme
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QGuiApplication
+
+from app.builtin.theme import ThemeManager, _palette_from_dict, _palette_to_dict
+
+
+def make_manager(cache_dir):
+    return ThemeManager.__wrapped__(cache_dir=cache_dir)
+
+
+def test_theme_cached(qapp, tmp_path, monkeypatch):
+    manager = make_manager(tmp_path)
+    changes = []
+    manager.theme_changed.connect(changes.append)
+
+    manager.setup_theme("dark")
+    manager.setup_theme("light")
+    manager.setup_theme("dark")
+
+    assert changes == ["dark", "light", "dark"]
+    assert qapp.styleSheet() == manager.compiled("dark").stylesheet
+    assert len(list(manager.cache_dir.glob("*.json"))) == 2
+
+    def build(*args, **kwargs):
+        raise AssertionError("theme built again")
+
+    # A new process loads the themes from the disk cache
+    monkeypatch.setattr(qdarktheme, "load_stylesheet", build)
+    other = make_manager(tmp_path)
+    assert other.compiled("light").stylesheet == manager.compiled("light").stylesheet
+
+
+def test_theme_rebuilt_without_icons(qapp, tmp_path, monkeypatch):
+    manager = make_manager(tmp_path)
+    icon_files = manager.compiled("dark").icon_files
+    assert icon_files
+    built = []
+    load_stylesheet = qdarktheme.load_stylesheet
+
+    def build(*args, **kwargs):
+        built.append(args)
+        return load_stylesheet(*args, **kwargs)
+
+    monkeypatch.setattr(qdarktheme, "load_stylesheet", build)
+    # qdarktheme writes the icons again when the theme is built
+    os.remove(icon_files[0])
+
+    make_manager(tmp_path).compiled("dark")
+
+    assert built
+    assert os.path.isfile(icon_files[0])
+
+
+def test_theme_without_private_api(qapp, tmp_path, monkeypatch):
+    import app.builtin.theme as theme
+
+    applied = []
+    monkeypatch.setattr(theme, "_install_proxy_style", lambda: False)
+    monkeypatch.setattr(qdarktheme, "setup_theme", lambda *args: applied.append(args))
+    manager = make_manager(tmp_path)
+
+    manager.setup_theme("light")
+
+    assert applied == [("light", "rounded")]
+    assert manager.applied == "light"
+    assert not list(manager.cache_dir.glob("*.json"))
+
+
+def test_same_theme_not_applied_again(qapp, tmp_path):
+    manager = make_manager(tmp_path)
+    changes = []
+    manager.theme_changed.connect(changes.append)
+
+    manager.setup_theme("dark")
+    qapp.setStyleSheet("")
+    manager.setup_theme("dark")
+
+    assert changes == ["dark"]
+    assert qapp.styleSheet() == ""
+
+
+def test_auto_follows_system(qapp, tmp_path, monkeypatch):
+    manager = make_manager(tmp_path)
+    scheme = ["dark"]
+    monkeypatch.setattr(manager, "resolve", lambda theme: scheme[0] if theme == "auto" else theme)
+    hints = QGuiApplication.styleHints()
+
+    manager.setup_theme("auto")
+    assert manager.applied == "dark"
+
+    scheme[0] = "light"
+    hints.colorSchemeChanged.emit(Qt.ColorScheme.Light)
+    assert manager.applied == "light"
+
+    manager.setup_theme("dark")
+    hints.colorSchemeChanged.emit(Qt.ColorScheme.Light)
+    assert manager.applied == "dark"
+
+
+def test_palette_round_trip(qapp):
+    palette = qdarktheme.load_palette("light", for_stylesheet=True)
+
+    assert _palette_from_dict(_palette_to_dict(palette)) == palette
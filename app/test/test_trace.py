@@ -0,0 +1,73 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.builtin import trace
+
+
+@pytest.fixture
+def events(monkeypatch):
+    events = []
+    monkeypatch.setattr(trace, "_events", events)
+    monkeypatch.setattr(trace, "enabled", True)
+    return events
+
+
+def by_name(events) -> dict[str, dict]:
+    return {event["name"]: event for event in events}
+
+
+def test_nested_spans(events, tmp_path):
+    with trace.span("outer"):
+        with trace.span("inner", step=1):
+            time.sleep(0.01)
+
+    spans = by_name(events)
+    outer, inner = spans["outer"], spans["inner"]
+    assert "args" not in outer
+    assert inner["args"] == {"step": 1, "parent": "outer"}
+    assert inner["dur"] >= 10_000
+    assert outer["ts"] <= inner["ts"]
+    assert outer["ts"] + outer["dur"] >= inner["ts"] + inner["dur"]
+
+    file = trace.dump(tmp_path / "trace.json")
+    assert json.loads(file.read_text(encoding="utf-8"))["traceEvents"] == events
+
+
+def test_async_spans(events):
+    @trace.span("child")
+    async def child():
+        await asyncio.sleep(0.01)
+
+    async def task(name):
+        with trace.span(name):
+            await child()
+
+    async def main():
+        await asyncio.gather(task("a"), task("b"))
+
+    asyncio.run(main())
+
+    # The tasks interleave, each child belongs to its own task
+    parents = sorted(e["args"]["parent"] for e in events if e["name"] == "child")
+    assert parents == ["a", "b"]
+
+
+def test_disabled(monkeypatch, tmp_path):
+    events = []
+    monkeypatch.setattr(trace, "_events", events)
+    monkeypatch.setattr(trace, "enabled", False)
+
+    @trace.span("decorated")
+    def decorated():
+        return 42
+
+    with trace.span("outer"):
+        assert decorated() == 42
+    trace.instant("instant")
+
+    assert events == []
+    assert trace.dump(tmp_path / "trace.json") is None
+    assert not (tmp_path / "trace.json").exists()
@@ -0,0 +1,608 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import tarfile
+import time
+import zipfile
+
+import httpx
+import pytest
+
+from app.builtin.update import ReleaseType, Version, newest_in_channel
+from conftest import PACKAGE
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.mark.parametrize(
+    "smaller, larger",
+    [
+        ("1.2.3", "1.2.10"),
+        ("1.2", "1.2.1-beta"),
+        ("1.0.dev1", "1.0a1"),
+        ("1.0rc1", "1.0-nightly"),
+        ("1.0", "1.0.post1"),
+    ],
+)
+def test_version_order(smaller, larger):
+    assert Version(smaller) < Version(larger)
+    assert Version(larger) > Version(smaller)
+
+
+def test_version_parse():
+    version = Version("01.2.0-beta")
+
+    assert version is Version("01.2.0-beta")
+    assert version == Version("1.2")
+    assert version.release_type == ReleaseType.BETA
+    assert str(version) == "1.2.0-beta"
+    with pytest.raises(RuntimeError):
+        Version("1.2.0-unknown")
+
+
+def test_newest_in_channel():
+    tags = ["1.0.0", "2.0.0-beta", "1.10.0", "1.9.0"]
+
+    assert newest_in_channel(tags, ReleaseType.STABLE) == (2, Version("1.10.0"))
+    assert newest_in_channel(tags, ReleaseType.NIGHTLY) is None
+
+
+def test_github_fetch(release_server, github):
+    release_server.add_release("0.9.0", {PACKAGE: b"stable"})
+    for i in range(25):
+        release_server.add_release(f"1.{i}.0-nightly", {PACKAGE: b"nightly"})
+
+    run(github.fetch())
+
+    assert str(github.remote_version) == "0.9.0-stable"
+    assert github.download_url == release_server.asset_url("0.9.0", PACKAGE)
+    assert github.content_length == len(b"stable")
+    assert github.accept_ranges
+    # 26 releases, 10 per page
+    assert len(release_server.requests_to("/releases")) == 3
+
+
+def test_github_fetch_backported_release(release_server, github):
+    for i in range(25):
+        release_server.add_release(f"2.{i}.0", {PACKAGE: b"new"})
+    for i in range(10):
+        release_server.add_release(f"1.{i}.0", {PACKAGE: b"old"})
+    # A patch for the old major version, published after 2.24.0
+    release_server.add_release("1.9.1", {PACKAGE: b"patch"})
+    github.current_version = Version("1.9.0")
+
+    run(github.fetch())
+
+    assert str(github.remote_version) == "2.24.0-stable"
+    # The third page only has older versions, the fourth is not requested
+    assert len(release_server.requests_to("/releases")) == 3
+
+
+def test_github_fetch_revalidates(release_server, github):
+    release_server.add_release("0.9.0", {PACKAGE: b"stable"})
+
+    run(github.fetch())
+    run(github.fetch())
+
+    responses = release_server.requests_to("/releases")
+    assert len(responses) == 2
+    assert "If-None-Match" in responses[1].headers
+
+
+def test_gitlab_fetch(release_server, gitlab):
+    release_server.add_release("0.9.0", {PACKAGE: b"stable"})
+
+    run(gitlab.fetch())
+    run(gitlab.fetch())
+
+    assert str(gitlab.remote_version) == "0.9.0-stable"
+    assert gitlab.download_url == release_server.asset_url("0.9.0", PACKAGE)
+    # The project ID is searched once and persisted
+    assert len(release_server.requests_to("/api/v4/projects", "GET")) == 3
+
+
+def test_fetch_checksum(release_server, github):
+    release_server.add_release(
+        "0.9.0", {PACKAGE: b"stable", f"{PACKAGE}.sha256": b"", "Other.zip.sha256": b""}
+    )
+
+    run(github.fetch())
+
+    assert github.download_url == release_server.asset_url("0.9.0", PACKAGE)
+    assert github.checksum_url == release_server.asset_url("0.9.0", f"{PACKAGE}.sha256")
+
+
+def test_fetch_server_error(release_server, github):
+    release_server.add_release("0.9.0", {PACKAGE: b"stable"})
+    release_server.fail("/releases", status=503)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(github.fetch())
+
+
+async def download(release_server, filename, connections=4, checksum=None):
+    from app.builtin.download import RangedDownloader
+
+    data = release_server.assets[("0.9.0", PACKAGE)]
+    async with release_server.client() as client:
+        downloader = RangedDownloader(
+            client,
+            release_server.asset_url("0.9.0", PACKAGE),
+            filename,
+            total_size=len(data),
+            accept_ranges=True,
+            connections=connections,
+            checksum=checksum,
+        )
+        await downloader.run()
+        return downloader
+
+
+def test_download_concurrent(release_server, tmp_path):
+    data = bytes(range(256)) * 4096
+    release_server.add_release("0.9.0", {PACKAGE: data})
+
+    run(download(release_server, tmp_path / PACKAGE))
+
+    assert (tmp_path / PACKAGE).read_bytes() == data
+    assert release_server.max_active == 4
+
+
+def test_download_resume(release_server, tmp_path):
+    from app.builtin.download import RangedDownloader
+
+    data = bytes(range(256)) * 4096
+    release_server.add_release("0.9.0", {PACKAGE: data})
+    # Every attempt of the first run breaks after 128 KiB
+    release_server.fail(
+        "/download/", times=1 + RangedDownloader.retries, status=None, after=128 * 1024
+    )
+
+    with pytest.raises(httpx.TransportError):
+        run(download(release_server, tmp_path / PACKAGE, connections=1))
+    assert (tmp_path / f"{PACKAGE}.journal").is_file()
+
+    release_server.requests.clear()
+    run(download(release_server, tmp_path / PACKAGE, connections=1))
+
+    assert (tmp_path / PACKAGE).read_bytes() == data
+    assert not (tmp_path / f"{PACKAGE}.journal").is_file()
+    assert release_server.requests[0].headers["Range"] != f"bytes=0-{len(data) - 1}"
+
+
+@pytest.mark.parametrize(
+    "journal",
+    [
+        "{",
+        '{"url": "%s", "total_size": 1048576}',
+        '{"url": "%s", "total_size": 1048576, "ranges": 1}',
+    ],
+)
+def test_download_bad_journal(release_server, tmp_path, journal):
+    data = bytes(range(256)) * 4096
+    release_server.add_release("0.9.0", {PACKAGE: data})
+    url = release_server.asset_url("0.9.0", PACKAGE)
+    (tmp_path / PACKAGE).write_bytes(bytes(len(data)))
+    (tmp_path / f"{PACKAGE}.journal").write_text(
+        journal.replace("%s", url), encoding="utf-8"
+    )
+
+    run(download(release_server, tmp_path / PACKAGE))
+
+    # The journal is ignored and the download starts over
+    assert (tmp_path / PACKAGE).read_bytes() == data
+    assert not (tmp_path / f"{PACKAGE}.journal").is_file()
+
+
+def test_download_stream(release_server, tmp_path):
+    from app.builtin.download import RangedDownloader
+
+    data = bytes(range(256)) * 8192
+    release_server.add_release("0.9.0", {PACKAGE: data})
+    release_server.accept_ranges = False
+
+    async def main():
+        async with release_server.client() as client:
+            downloader = RangedDownloader(
+                client, release_server.asset_url("0.9.0", PACKAGE), tmp_path / PACKAGE
+            )
+            await downloader.run()
+            return downloader
+
+    downloader = run(main())
+
+    assert (tmp_path / PACKAGE).read_bytes() == data
+    assert downloader.downloaded == downloader.total_size == len(data)
+
+
+def make_checksum(data, block_size):
+    from app.builtin.checksum import Checksum
+
+    blocks = [
+        hashlib.sha256(data[i : i + block_size]).hexdigest()
+        for i in range(0, len(data), block_size)
+    ]
+    return Checksum(hashlib.sha256(data).hexdigest(), len(data), block_size, blocks)
+
+
+def test_download_repairs_corrupt_block(release_server, tmp_path):
+    data = bytes(range(256)) * 4096
+    release_server.add_release("0.9.0", {PACKAGE: data})
+    release_server.corrupt("/download/", offset=300_000)
+
+    downloader = run(
+        download(release_server, tmp_path / PACKAGE, checksum=make_checksum(data, 64 * 1024))
+    )
+
+    assert (tmp_path / PACKAGE).read_bytes() == data
+    assert downloader.repaired
+    # Only the corrupt block is downloaded again
+    assert release_server.requests[-1].headers["Range"] == "bytes=262144-327679"
+
+
+def test_download_checksum_mismatch(release_server, tmp_path):
+    from app.builtin.checksum import Checksum, ChecksumError
+
+    data = bytes(range(256)) * 4096
+    release_server.add_release("0.9.0", {PACKAGE: data})
+    checksum = Checksum(hashlib.sha256(b"other").hexdigest(), len(data))
+
+    with pytest.raises(ChecksumError):
+        run(download(release_server, tmp_path / PACKAGE, checksum=checksum))
+    assert not (tmp_path / PACKAGE).exists()
+
+
+def test_download_bandwidth(release_server, tmp_path):
+    from app.builtin.download import RangedDownloader
+
+    data = bytes(range(256)) * 4096
+    release_server.add_release("0.9.0", {PACKAGE: data})
+
+    async def main():
+        async with release_server.client() as client:
+            await RangedDownloader(
+                client,
+                release_server.asset_url("0.9.0", PACKAGE),
+                tmp_path / PACKAGE,
+                total_size=len(data),
+                accept_ranges=True,
+                bandwidth=2 * 1024 * 1024,
+            ).run()
+
+    started = time.monotonic()
+    run(main())
+
+    assert (tmp_path / PACKAGE).read_bytes() == data
+    # 1 MiB at 2 MiB/s, minus the initial burst of 0.1 s
+    assert time.monotonic() - started >= 0.35
+
+
+def test_rollout(app_paths):
+    from app.builtin.rollout import in_rollout, load_install_id
+
+    install_id = load_install_id(app_paths.base_dir)
+    assert load_install_id(app_paths.base_dir) == install_id
+
+    ids = [f"{i:032x}" for i in range(2000)]
+    rolled_out = {i for i in ids if in_rollout(i, "1.0.0-stable", 25)}
+    assert 400 < len(rolled_out) < 600
+    # Raising the percentage keeps the installs already rolled out
+    assert rolled_out <= {i for i in ids if in_rollout(i, "1.0.0-stable", 50)}
+    assert all(in_rollout(i, "1.0.0-stable", 100) for i in ids)
+    assert not any(in_rollout(i, "1.0.0-stable", 0) for i in ids)
+
+
+def test_rollout_config(github, tmp_path):
+    config = tmp_path / "rollout.json"
+    config.write_text('{"rollout": 0, "bandwidth_limit": 1024}', encoding="utf-8")
+
+    github.load_rollout_from_file(config)
+    github.remote_version = Version("9.0.0")
+
+    assert github.bandwidth_limit == 1024
+    assert not github.in_rollout()
+
+
+def zip_package(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("error", [None, OSError, "BadZipFile"])
+def test_delta_falls_back_to_package(release_server, github, monkeypatch, error):
+    from app.builtin.update_package import PackageStage, UpdatePackage
+
+    monkeypatch.setattr("app.builtin.update_package.is_onedir_build", lambda: True)
+    github.current_version = Version("0.8.0")
+    delta_name = f"{PACKAGE[: -len('.zip')]}-delta-0.8.0.zip"
+    release_server.add_release(
+        "0.9.0",
+        {PACKAGE: zip_package({"App/app": b"full"}), delta_name: b"not a zip"},
+    )
+    if error is not None:
+        error = zipfile.BadZipFile if error == "BadZipFile" else error
+
+        def apply_delta(*args):
+            raise error("Injected failure")
+
+        monkeypatch.setattr("app.builtin.update_package.apply_delta", apply_delta)
+
+    run(github.fetch())
+    assert github.delta_url == release_server.asset_url("0.9.0", delta_name)
+    stages = []
+    run(UpdatePackage(github, on_stage=stages.append).prepare())
+
+    assert stages[-1] == PackageStage.EXTRACT
+    assert release_server.requests_to(f"/{PACKAGE}", "GET")
+    update_dir = github.filename.rsplit("/", 1)[0]
+    with open(f"{update_dir}/App/app", "rb") as f:
+        assert f.read() == b"full"
+
+
+def test_delta_skipped_for_other_layouts(release_server, github, monkeypatch):
+    from app.builtin.update_package import UpdatePackage
+
+    # e.g. a onefile build or a macOS bundle
+    monkeypatch.setattr("app.builtin.update_package.is_onedir_build", lambda: False)
+    github.current_version = Version("0.8.0")
+    delta_name = f"{PACKAGE[: -len('.zip')]}-delta-0.8.0.zip"
+    release_server.add_release(
+        "0.9.0", {PACKAGE: zip_package({"App/app": b"full"}), delta_name: b"delta"}
+    )
+
+    run(github.fetch())
+    assert github.delta_url
+    run(UpdatePackage(github).prepare())
+
+    assert not release_server.requests_to(f"/{delta_name}")
+    assert release_server.requests_to(f"/{PACKAGE}", "GET")
+
+
+@pytest.mark.parametrize(
+    "frozen, exe_dir, bundle_dir, onedir",
+    [
+        (False, "install", None, False),
+        (True, "install", None, True),
+        # PyInstaller onedir keeps its files in a subdirectory
+        (True, "install", "install/_internal", True),
+        # PyInstaller onefile
+        (True, "install", "tmp/_MEI1234", False),
+        # Nuitka onefile
+        (True, "tmp/onefile_1234", None, False),
+    ],
+)
+def test_is_onedir_build(tmp_path, monkeypatch, frozen, exe_dir, bundle_dir, onedir):
+    import sys
+
+    from app.builtin.update import is_onedir_build
+
+    monkeypatch.setattr(sys, "platform", "linux")
+    monkeypatch.setattr(sys, "frozen", frozen, raising=False)
+    monkeypatch.setattr(sys, "executable", str(tmp_path / exe_dir / "App"))
+    if bundle_dir is None:
+        monkeypatch.delattr(sys, "_MEIPASS", raising=False)
+    else:
+        monkeypatch.setattr(sys, "_MEIPASS", str(tmp_path / bundle_dir), raising=False)
+    (tmp_path / "install").mkdir()
+    monkeypatch.chdir(tmp_path / "install")
+
+    assert is_onedir_build() == onedir
+
+
+@pytest.mark.parametrize("error", [httpx.ConnectError("offline"), FileNotFoundError()])
+def test_scheduler_reports_errors(qapp, github, monkeypatch, caplog, error):
+    from app.builtin.update_scheduler import UpdateScheduler
+
+    caplog.set_level(logging.INFO, "app.builtin.update_scheduler")
+
+    async def fetch():
+        raise error
+
+    monkeypatch.setattr(github, "fetch", fetch)
+    scheduler = UpdateScheduler(github)
+    scheduler.backoff_base = 0
+    scheduler.next_delay = lambda: 0
+    reported = []
+    scheduler.check_failed.connect(reported.append)
+
+    async def main():
+        scheduler.start(delay=0)
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+
+    run(main())
+
+    assert caplog.records
+    if isinstance(error, httpx.HTTPError):
+        # Expected while offline, retried without telling the user
+        assert not reported
+    else:
+        assert reported and reported[0] is error
+        assert caplog.records[0].exc_info[1] is error
+
+
+def test_download_longer_than_checksum(release_server, tmp_path):
+    from app.builtin.checksum import ChecksumError
+    from app.builtin.download import RangedDownloader
+
+    data = bytes(range(256)) * 4096
+    release_server.add_release("0.9.0", {PACKAGE: data})
+    release_server.accept_ranges = False
+    # Published for a shorter package, the response has no range support
+    checksum = make_checksum(data[: 256 * 1024], 64 * 1024)
+
+    async def main():
+        async with release_server.client() as client:
+            await RangedDownloader(
+                client,
+                release_server.asset_url("0.9.0", PACKAGE),
+                tmp_path / PACKAGE,
+                checksum=checksum,
+            ).run()
+
+    with pytest.raises(ChecksumError):
+        run(asyncio.wait_for(main(), 10))
+
+
+def test_writer_error_releases_buffers(tmp_path):
+    from app.builtin.download import BufferedFileWriter
+
+    def on_data(offset, data):
+        raise ValueError("bad data")
+
+    async def main():
+        writer = BufferedFileWriter(tmp_path / "file", "wb", 16, 2, on_data)
+        buffer = await writer.acquire()
+        writer.submit(buffer, 4, 0)
+        with pytest.raises(ValueError):
+            await writer.close()
+        # Both buffers are back on the free list
+        assert writer._free.qsize() == 2
+
+    run(asyncio.wait_for(main(), 10))
+
+
+@pytest.mark.parametrize(
+    "offset",
+    [
+        # Breaks the compressed stream, the extraction stops early
+        100,
+        # Changes the content of a file, the extraction goes on
+        57620,
+    ],
+)
+def test_stream_install_repairs_corrupt_block(
+    release_server, github, tmp_path, monkeypatch, offset
+):
+    from app.builtin.checksum import create_checksum
+    from app.builtin.update_package import UpdatePackage
+
+    rng = random.Random(0)
+    # Compressible, so a flipped byte can break the deflate stream
+    files = {
+        f"App/stream/{i}": bytes(rng.choices(b"abcdefgh", k=8192)) for i in range(100)
+    }
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tf:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    package = buffer.getvalue()
+    tar_package = PACKAGE.replace(".zip", ".tar.gz")
+    (tmp_path / tar_package).write_bytes(package)
+    checksum = json.dumps(create_checksum(tmp_path / tar_package, 64 * 1024))
+    release_server.add_release(
+        "0.9.0", {tar_package: package, f"{tar_package}.sha256": checksum.encode()}
+    )
+    # Small chunks, so the rest of the package does not fit into the pipe
+    release_server.chunk_size = 1024
+    load_checksum = UpdatePackage.load_checksum
+
+    async def load_checksum_then_corrupt(self):
+        checksum = await load_checksum(self)
+        # The path of the checksum file contains the package name too
+        release_server.corrupt(f"/{tar_package}", offset)
+        return checksum
+
+    monkeypatch.setattr(UpdatePackage, "load_checksum", load_checksum_then_corrupt)
+
+    run(github.fetch())
+    assert UpdatePackage(github).can_stream_extract()
+    run(UpdatePackage(github).prepare())
+
+    update_dir = os.path.dirname(github.filename)
+    for name, data in files.items():
+        with open(f"{update_dir}/{name}", "rb") as f:
+            assert f.read() == data
+    # Only the corrupt block is downloaded again
+    start = offset // (64 * 1024) * 64 * 1024
+    assert release_server.requests[-1].headers["Range"] == (
+        f"bytes={start}-{start + 64 * 1024 - 1}"
+    )
+
+
+def test_update_widget_prewarmed_when_update_found(
+    qapp, release_server, github, monkeypatch
+):
+    from app.builtin.update_package import UpdatePackage
+    from app.builtin.update_scheduler import UpdateScheduler
+    from app.main_window import MainWindow
+
+    async def prepare(self):
+        pass
+
+    monkeypatch.setattr(UpdatePackage, "prepare", prepare)
+    window = MainWindow(github)
+    scheduler = UpdateScheduler(github)
+    scheduler.update_available.connect(window.prewarm_update_widget)
+    try:
+        release_server.add_release("0.0.1", {PACKAGE: b"old"})
+        github.current_version = Version("0.9.0")
+        assert not run(scheduler.check())
+        assert window.update_widgets is None
+
+        release_server.add_release("1.0.0", {PACKAGE: b"new"})
+        assert run(scheduler.check())
+        # Built when the event loop is idle
+        qapp.processEvents()
+        assert window.update_widgets._idle
+    finally:
+        window.deleteLater()
+
+
+def test_scheduler_keeps_prepared_update(release_server, github, monkeypatch):
+    from app.builtin.update_package import UpdatePackage
+    from app.builtin.update_scheduler import UpdateScheduler
+
+    prepared = []
+
+    async def prepare(self):
+        prepared.append(self.updater.remote_version)
+
+    monkeypatch.setattr(UpdatePackage, "prepare", prepare)
+    scheduler = UpdateScheduler(github)
+    github.current_version = Version("0.9.0")
+    release_server.add_release("1.0.0", {PACKAGE: b"new"})
+
+    assert run(scheduler.check())
+    # Declined, the next check asks again without downloading
+    assert run(scheduler.check())
+    assert prepared == [Version("1.0.0")]
+
+    release_server.add_release("1.1.0", {PACKAGE: b"newer"})
+    assert run(scheduler.check())
+    assert prepared == [Version("1.0.0"), Version("1.1.0")]
+
+
+def test_check_update_schedules_after_update(qapp, github, monkeypatch):
+    from PySide6.QtWidgets import QMessageBox
+
+    from app.main_window import MainWindow
+
+    shown = []
+    monkeypatch.setattr(QMessageBox, "information", lambda *args: shown.append(args))
+    github.is_updated = True
+    window = MainWindow(github)
+
+    async def main():
+        await window.check_update()
+        running = window.update_scheduler.running
+        window.update_scheduler.stop()
+        return running
+
+    try:
+        assert run(main())
+        assert shown
+    finally:
+        qapp.processEvents()
+        window.deleteLater()